@@ -0,0 +1,6 @@
+# -*- coding: UTF-8 -*-
+"""
+Benchmarks of TwitterMonitor hot paths. Run with::
+
+    python -m benchmarks --output results.json
+"""
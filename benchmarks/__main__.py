@@ -0,0 +1,174 @@
+# -*- coding: UTF-8 -*-
+
+from twitter_monitor.common import version
+from twitter_monitor.core import Executor, Notifier, Routine
+from twitter_monitor.store import BACKENDS
+from .fake_api import FakeTwitterApi
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+
+class TrivialRoutine(Routine):
+
+    def _execute(self):
+        return True
+
+
+def create_routines(count):
+    """
+    Create ``count`` distinct routine classes (uid depends on class name).
+    """
+
+    return [type("TrivialRoutine{}".format(i), (TrivialRoutine,), {})
+            for i in range(count)]
+
+
+def measure(func, repeat):
+    """
+    Returns the best time (in seconds) of ``repeat`` calls to ``func``.
+    """
+
+    best = None
+
+    for i in range(repeat):
+        started_at = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started_at
+
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+def bench_executor_run(sizes, repeat):
+    for size in sizes:
+        executor = Executor(FakeNotifier(), create_routines(size), {})
+        executor.routines_instances()
+
+        seconds = measure(executor.run, repeat)
+
+        yield result("executor.run", {"routines": size}, seconds, size)
+
+
+def bench_notifier_send(sizes, repeat, latency, workers):
+    for size in sizes:
+        api = FakeTwitterApi(followers=size, latency=latency)
+        notifier = Notifier(api, max_workers=workers)
+
+        # Load followers before measuring
+        notifier.followers.get()
+
+        seconds = measure(lambda: notifier.send("Message"), repeat)
+
+        yield result(
+            "notifier.send",
+            {"followers": size, "latency": latency, "workers": workers},
+            seconds, size)
+
+
+def bench_store(backends, size, repeat):
+    items = {"key{}".format(i): "2014-05-13 17:53:20.000000"
+             for i in range(size)}
+
+    for backend in backends:
+        dir = tempfile.mkdtemp()
+
+        try:
+            store = BACKENDS[backend](os.path.join(dir, "store"))
+
+            seconds = measure(lambda: store.set_many(items), repeat)
+            yield result("store.set_many", {"backend": backend,
+                         "keys": size}, seconds, size)
+
+            seconds = measure(lambda: store.get_many(items), repeat)
+            yield result("store.get_many", {"backend": backend,
+                         "keys": size}, seconds, size)
+
+            def set_each():
+                for key, value in items.items():
+                    store[key] = value
+
+            seconds = measure(set_each, repeat)
+            yield result("store.set", {"backend": backend,
+                         "keys": size}, seconds, size)
+
+            def get_each():
+                for key in items:
+                    store.get(key)
+
+            seconds = measure(get_each, repeat)
+            yield result("store.get", {"backend": backend,
+                         "keys": size}, seconds, size)
+
+            store.close()
+        finally:
+            shutil.rmtree(dir)
+
+
+class FakeNotifier(object):
+
+    def send(self, *args, **kwargs):
+        return []
+
+
+def result(name, params, seconds, operations):
+    return {
+        "name": name,
+        "params": params,
+        "seconds": seconds,
+        "ops_per_second": operations / seconds if seconds else None,
+    }
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="TwitterMonitor - Benchmarks")
+    parser.add_argument("-o", "--output", help="JSON output file")
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    parser.add_argument("-l", "--latency", type=float, default=0.0,
+                        help="Fake API latency (seconds)")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="Notifier workers")
+    parser.add_argument("-q", "--quick", action="store_true",
+                        help="Run only small sizes")
+
+    options = parser.parse_args(args)
+
+    routines_sizes = [10, 1000] if options.quick else [10, 1000, 10000]
+    followers_sizes = [10, 100] if options.quick else [10, 100, 1000, 10000]
+    store_size = 100 if options.quick else 1000
+
+    results = []
+    results.extend(bench_executor_run(routines_sizes, options.repeat))
+    results.extend(bench_notifier_send(
+        followers_sizes, options.repeat, options.latency, options.workers))
+    results.extend(bench_store(sorted(BACKENDS), store_size, options.repeat))
+
+    report = {
+        "version": version,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created_at": time.time(),
+        "results": results,
+    }
+
+    output = json.dumps(report, indent=2)
+
+    if options.output is None:
+        print(output)
+    else:
+        with open(options.output, "w") as f:
+            f.write(output)
+
+    return 0
+
+
+if __name__ == "__main__":
+    logging.getLogger("").addHandler(logging.NullHandler())
+    sys.exit(main())
@@ -0,0 +1,59 @@
+# -*- coding: UTF-8 -*-
+
+import threading
+import time
+
+
+class FakeUser(object):
+
+    def __init__(self, id, screen_name):
+        self.id = id
+        self.screen_name = screen_name
+
+
+class FakeTwitterApi(object):
+    """
+    Deterministic stand-in for tweepy API with the methods used by
+    :class:`twitter_monitor.core.Notifier`.
+
+    :param followers: Number of followers.
+    :param latency: Seconds each API call takes.
+    :param page_size: Follower ids per page.
+    """
+
+    def __init__(self, followers=10, latency=0.0, page_size=5000):
+        self.latency = latency
+        self.page_size = page_size
+        self.users = [FakeUser(i + 1, "follower{}".format(i + 1))
+                      for i in range(followers)]
+
+        self.calls = 0
+        self.sent = 0
+        self._lock = threading.Lock()
+
+    def followers_ids(self, cursor=-1):
+        self._call()
+
+        start = 0 if cursor == -1 else cursor
+        end = start + self.page_size
+        next_cursor = end if end < len(self.users) else 0
+
+        return [u.id for u in self.users[start:end]], (start, next_cursor)
+
+    def lookup_users(self, user_ids):
+        self._call()
+
+        return [self.users[i - 1] for i in user_ids]
+
+    def send_direct_message(self, user_id, text):
+        self._call()
+
+        with self._lock:
+            self.sent += 1
+
+    def _call(self):
+        with self._lock:
+            self.calls += 1
+
+        if self.latency:
+            time.sleep(self.latency)
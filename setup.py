@@ -28,7 +28,12 @@ setup(
     packages=packages,
     classifiers=[
         "Programming Language :: Python",
-        "Programming Language :: Python :: 3.3",
+        "Programming Language :: Python :: 3",
+        "Programming Language :: Python :: 3 :: Only",
+        "Programming Language :: Python :: 3.9",
+        "Programming Language :: Python :: 3.10",
+        "Programming Language :: Python :: 3.11",
+        "Programming Language :: Python :: 3.12",
         "Development Status :: 3 - Alpha",
         "Operating System :: MacOS",
         "Operating System :: Unix",
@@ -40,9 +45,10 @@ setup(
         "Topic :: System :: Monitoring",
         "Topic :: Utilities",
     ],
+    python_requires=">=3.9",
     install_requires=[
         "tweepy>=2.3",
     ],
-    description="Small library to create monitoring routines with Twitter DM. (Python >= 3.3)",
+    description="Small library to create monitoring routines with Twitter DM. (Python >= 3.9)",
     long_description=long_description
 )
@@ -0,0 +1,102 @@
+# -*- coding: UTF-8 -*-
+
+from twitter_monitor.aio import AsyncExecutor, AsyncRoutine
+from twitter_monitor.metrics import Registry
+from tests.test_core import RoutineTest, FailingRoutineTest
+from tests.test_core import DatabaseRoutineTest, ReleasingRoutineTest
+from tests.test_core import SlowRoutineTest
+from mock import Mock, call
+import asyncio
+import unittest
+
+
+class AsyncRoutineTest(AsyncRoutine):
+
+    short_name = "Async"
+
+    async def _execute(self):
+        await asyncio.sleep(0)
+        await self.notify_async("Async message")
+        return True
+
+
+class HangingAsyncRoutineTest(AsyncRoutine):
+
+    timeout_seconds = 0.05
+
+    async def _execute(self):
+        await asyncio.sleep(5)
+        return True
+
+
+class AsyncExecutorTestCase(unittest.TestCase):
+
+    def test_run(self):
+        notifier = Mock(name="NotifierTest")
+        store = {}
+        e = AsyncExecutor(notifier, [AsyncRoutineTest, RoutineTest], store)
+
+        self.assertTrue(e.run())
+
+        self.assertCountEqual(
+            [call("Async: Async message"), call("Rout. Tést: Tést message")],
+            notifier.send.call_args_list)
+
+        for rt in e.routines_instances():
+            self.assertIsNotNone(rt.last_execution)
+
+    def test_executor_parameters(self):
+        metrics = Registry()
+        e = AsyncExecutor(Mock(name="NotifierTest"), [AsyncRoutineTest],
+                          metrics=metrics)
+
+        self.assertTrue(e.run())
+        self.assertIn(
+            'twitter_monitor_routine_runs_total{routine="AsyncRoutineTest",'
+            'status="success"} 1', metrics.render())
+
+    def test_run_with_failure(self):
+        notifier = Mock(name="NotifierTest")
+        e = AsyncExecutor(notifier, [AsyncRoutineTest, FailingRoutineTest])
+
+        self.assertFalse(e.run())
+
+    def test_run_dependencies_without_barrier(self):
+        SlowRoutineTest.released.clear()
+        e = AsyncExecutor(Mock(name="NotifierTest"),
+                          [SlowRoutineTest, DatabaseRoutineTest,
+                           ReleasingRoutineTest])
+
+        self.assertTrue(e.run())
+
+    def test_run_async(self):
+        notifier = Mock(name="NotifierTest")
+        e = AsyncExecutor(notifier, [AsyncRoutineTest])
+
+        self.assertTrue(asyncio.run(e.run_async()))
+        notifier.send.assert_called_once_with("Async: Async message")
+
+    def test_run_async_post_cycle(self):
+        notifier = Mock(name="NotifierTest")
+        profiler = Mock(name="Profiler")
+        deduplicator = Mock(name="Deduplicator")
+        deduplicator.expired.return_value = []
+        deduplicator.check.side_effect = lambda uid, message: message
+        e = AsyncExecutor(notifier, [AsyncRoutineTest], profiler=profiler,
+                          deduplicator=deduplicator)
+
+        self.assertTrue(asyncio.run(e.run_async()))
+
+        deduplicator.save.assert_called_once_with()
+        profiler.report.assert_called_once_with()
+        notifier.flush.assert_called_once_with()
+
+    def test_run_with_timeout(self):
+        notifier = Mock(name="NotifierTest")
+        e = AsyncExecutor(notifier, [HangingAsyncRoutineTest])
+
+        self.assertFalse(e.run())
+
+        self.assertEqual("timeout", e.routines_instances()[0].last_status)
+        notifier.send.assert_called_once_with(
+            "HangingAsyncRoutineTest: Timeout after 0.05 seconds")
@@ -0,0 +1,129 @@
+# -*- coding: UTF-8 -*-
+
+from twitter_monitor.cache import ProbeCache
+from twitter_monitor.core import Executor, Routine
+from tests.test_core import FakeClock
+from mock import Mock
+import threading
+import unittest
+
+
+class ProbeCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = ProbeCache(max_entries=2, ttl_seconds=10,
+                                clock=self.clock)
+        self.fetch = Mock(side_effect=lambda *args, **kwargs: args)
+
+    def test_get(self):
+        self.assertEqual((1,), self.cache.get("probe", self.fetch, 1))
+        self.assertEqual((1,), self.cache.get("probe", self.fetch, 1))
+        self.assertEqual((2,), self.cache.get("probe", self.fetch, 2))
+
+        self.assertEqual(2, self.fetch.call_count)
+
+    def test_ttl(self):
+        self.cache.get("probe", self.fetch)
+        self.cache.get("other", self.fetch, ttl=60)
+
+        self.clock.now += 30
+        self.cache.get("probe", self.fetch)
+        self.cache.get("other", self.fetch)
+
+        self.assertEqual(3, self.fetch.call_count)
+
+    def test_lru_eviction(self):
+        self.cache.get("a", self.fetch)
+        self.cache.get("b", self.fetch)
+        self.cache.get("a", self.fetch)
+        self.cache.get("c", self.fetch)
+
+        self.assertEqual(2, len(self.cache))
+        self.cache.get("a", self.fetch)
+        self.assertEqual(3, self.fetch.call_count)
+
+        self.cache.get("b", self.fetch)
+        self.assertEqual(4, self.fetch.call_count)
+
+    def test_errors_are_not_cached(self):
+        self.fetch.side_effect = [Exception("Error"), "value"]
+
+        self.assertRaises(Exception, self.cache.get, "probe", self.fetch)
+        self.assertEqual("value", self.cache.get("probe", self.fetch))
+
+    def test_invalidate(self):
+        self.cache.get("a", self.fetch)
+        self.cache.get("b", self.fetch)
+
+        self.cache.invalidate("a")
+        self.assertEqual(1, len(self.cache))
+
+        self.cache.invalidate()
+        self.assertEqual(0, len(self.cache))
+
+    def test_concurrent_calls_are_coalesced(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def fetch():
+            started.set()
+            release.wait(5)
+            return "value"
+
+        fetch = Mock(side_effect=fetch)
+        results = []
+
+        def get():
+            results.append(self.cache.get("probe", fetch))
+
+        threads = [threading.Thread(target=get) for i in range(5)]
+        threads[0].start()
+        started.wait(5)
+
+        for thread in threads[1:]:
+            thread.start()
+
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(["value"] * 5, results)
+        self.assertEqual(1, fetch.call_count)
+
+
+STATUS = Mock(return_value={"db": "up", "queue": "down"})
+
+
+class DatabaseRoutineTest(Routine):
+
+    def _execute(self):
+        return self.probe("status", STATUS)["db"] == "up"
+
+
+class QueueRoutineTest(Routine):
+
+    def _execute(self):
+        return self.probe("status", STATUS)["queue"] == "up"
+
+
+class RoutineProbeTestCase(unittest.TestCase):
+
+    def test_routines_share_probe(self):
+        STATUS.reset_mock()
+        e = Executor(Mock(name="NotifierTest"),
+                     [DatabaseRoutineTest, QueueRoutineTest])
+
+        self.assertFalse(e.run())
+        self.assertFalse(e.run())
+
+        self.assertEqual(1, STATUS.call_count)
+
+    def test_probe_without_cache(self):
+        STATUS.reset_mock()
+        rt = DatabaseRoutineTest(Mock(name="NotifierTest"), {})
+
+        rt.run()
+        rt.run()
+
+        self.assertEqual(2, STATUS.call_count)
@@ -4,6 +4,15 @@ from twitter_monitor.core import Notifier, Routine, Executor, ExecutorFactory
 from mock import MagicMock, Mock, call
 import unittest
 import datetime
+import os
+import threading
+import time
+
+
+class Follower:
+    def __init__(self, screen_name, id):
+        self.screen_name = screen_name
+        self.id = id
 
 
 def create_twitter_api_mock():
@@ -11,18 +20,48 @@ def create_twitter_api_mock():
     Create a mocked twitter api to use with tests
     """
 
-    class Follower:
-        def __init__(self, screen_name, id):
-            self.screen_name = screen_name
-            self.id = id
-
     api = MagicMock(name="TwitterApi")
 
-    api.followers.return_value = [Follower("alissonperez", 42)]
+    set_api_followers(api, [Follower("alissonperez", 42)])
 
     return api
 
 
+class FakeClock:
+    """
+    Clock controlled by tests (``sleep`` only moves it forward)
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def set_api_followers(api, followers, page_size=5000):
+    """
+    Setup followers returned by the mocked api (paged with cursors)
+    """
+
+    ids = [f.id for f in followers]
+
+    def followers_ids(cursor=-1):
+        start = 0 if cursor == -1 else cursor
+        end = start + page_size
+        next_cursor = end if end < len(ids) else 0
+        return ids[start:end], (start, next_cursor)
+
+    def lookup_users(user_ids):
+        return [f for f in followers if f.id in user_ids]
+
+    api.followers_ids.side_effect = followers_ids
+    api.lookup_users.side_effect = lookup_users
+
+
 class RoutineTest(Routine):
 
     name = "Routine Tést"      # Keep accent to test unicode conversion
@@ -33,6 +72,134 @@ class RoutineTest(Routine):
         return True
 
 
+class FailingRoutineTest(Routine):
+
+    def _execute(self):
+        return False
+
+
+class BrokenRoutineTest(Routine):
+
+    def _execute(self):
+        raise Exception("Broken routine")
+
+
+class IntervalRoutineTest(Routine):
+
+    interval_minutes = 10
+
+    def _execute(self):
+        self.notify("Interval message")
+        return True
+
+
+class ProcessRoutineTest(Routine):
+
+    run_in_process = True
+    interval_minutes = 10
+
+    def _execute(self):
+        self.notify("Process {}".format(os.getpid()))
+        return True
+
+
+class HangingRoutineTest(Routine):
+
+    timeout_seconds = 0.05
+
+    released = threading.Event()
+
+    def _execute(self):
+        self.released.wait(5)
+        return True
+
+
+class HangingProcessRoutineTest(Routine):
+
+    run_in_process = True
+    timeout_seconds = 0.5
+
+    def _execute(self):
+        time.sleep(30)
+        return True
+
+
+class SlowProcessRoutineTest(Routine):
+
+    run_in_process = True
+    timeout_seconds = 10
+
+    def _execute(self):
+        time.sleep(1)
+        return True
+
+
+class QuickProcessRoutineTest(Routine):
+
+    run_in_process = True
+    timeout_seconds = 0.5
+
+    def _execute(self):
+        return True
+
+
+class CheckpointRoutineTest(Routine):
+
+    fail = False
+
+    def _execute(self):
+        self.checkpoint = (self.checkpoint or 0) + 1
+        return not self.fail
+
+
+class ProcessCheckpointRoutineTest(CheckpointRoutineTest):
+
+    run_in_process = True
+
+
+class DatabaseRoutineTest(Routine):
+
+    up = True
+
+    def _execute(self):
+        return self.up
+
+
+class DatabaseQueryRoutineTest(Routine):
+
+    depends_on = [DatabaseRoutineTest]
+
+    def _execute(self):
+        self.notify("Query")
+        return True
+
+
+class DatabaseReportRoutineTest(Routine):
+
+    depends_on = [DatabaseQueryRoutineTest]
+
+    def _execute(self):
+        self.notify("Report")
+        return True
+
+
+class SlowRoutineTest(Routine):
+
+    released = threading.Event()
+
+    def _execute(self):
+        return self.released.wait(5)
+
+
+class ReleasingRoutineTest(Routine):
+
+    depends_on = [DatabaseRoutineTest]
+
+    def _execute(self):
+        SlowRoutineTest.released.set()
+        return True
+
+
 class ExecutorTestCase(unittest.TestCase):
 
     def test_run(self):
@@ -43,6 +210,250 @@ class ExecutorTestCase(unittest.TestCase):
 
         notifier.send.assert_called_once_with("Rout. Tést: Tést message")
 
+    def test_run_with_failure(self):
+        notifier = Mock(name="NotifierTest")
+        e = Executor(notifier, [FailingRoutineTest, RoutineTest])
+
+        self.assertFalse(e.run())
+
+        notifier.send.assert_called_once_with("Rout. Tést: Tést message")
+
+    def test_run_with_exception(self):
+        notifier = Mock(name="NotifierTest")
+        e = Executor(notifier, [BrokenRoutineTest, RoutineTest])
+
+        self.assertFalse(e.run())
+
+        notifier.send.assert_called_once_with("Rout. Tést: Tést message")
+
+    def test_run_concurrent(self):
+        notifier = Mock(name="NotifierTest")
+        store = {}
+        e = Executor(notifier, [RoutineTest, FailingRoutineTest], store, 4)
+
+        self.assertFalse(e.run())
+
+        notifier.send.assert_called_once_with("Rout. Tést: Tést message")
+        self.assertIn(e.routines_instances()[0].uid, store)
+
+    def test_run_in_process(self):
+        notifier = Mock(name="NotifierTest")
+        store = {}
+        e = Executor(notifier, [ProcessRoutineTest, RoutineTest], store,
+                     processes=1)
+
+        try:
+            self.assertTrue(e.run())
+            self.assertEqual(2, notifier.send.call_count)
+            messages = [c[0][0] for c in notifier.send.call_args_list]
+            self.assertIn("Rout. Tést: Tést message", messages)
+            self.assertNotIn(
+                "ProcessRoutineTest: Process {}".format(os.getpid()),
+                messages)
+
+            uid = e.routines_instances()[0].uid
+            self.assertIn(uid, store)
+
+            # Interval not reached, so it's skipped without a worker
+            self.assertTrue(e.run())
+            self.assertEqual(3, notifier.send.call_count)
+        finally:
+            e.close()
+
+    def test_run_with_process_timeout(self):
+        notifier = Mock(name="NotifierTest")
+        e = Executor(notifier, [HangingProcessRoutineTest,
+                                ProcessRoutineTest], {}, processes=1)
+
+        started_at = time.time()
+        try:
+            self.assertFalse(e.run())
+        finally:
+            e.close()
+
+        self.assertLess(time.time() - started_at, 10)
+
+        hanging, process = e.routines_instances()
+        self.assertEqual("timeout", hanging.last_status)
+        self.assertEqual("success", process.last_status)
+
+    def test_process_timeout_starts_in_worker(self):
+        # Quick routine waits for the slow one, but its timeout only
+        # counts after it starts.
+        notifier = Mock(name="NotifierTest")
+        e = Executor(notifier, [SlowProcessRoutineTest,
+                                QuickProcessRoutineTest], {}, 4,
+                     processes=1)
+
+        try:
+            self.assertTrue(e.run())
+        finally:
+            e.close()
+
+        self.assertEqual(["success", "success"],
+                         [rt.last_status for rt in e.routines_instances()])
+        self.assertFalse(notifier.send.called)
+
+    def test_recycle_replaced_process_pool(self):
+        e = Executor(Mock(name="NotifierTest"), [ProcessRoutineTest], {},
+                     processes=1)
+        rt = e.routines_instances()[0]
+
+        try:
+            old = e._submit_to_process(rt)
+            old.future.result(30)
+            e._recycle_process_pool(old.pool)
+
+            new = e._submit_to_process(rt)
+
+            # Another thread recycling the old pool doesn't touch this one
+            e._recycle_process_pool(old.pool)
+            self.assertIs(new.pool, e._process_pool)
+            new.future.result(30)
+        finally:
+            e.close()
+
+    def test_run_with_timeout(self):
+        notifier = Mock(name="NotifierTest")
+        e = Executor(notifier, [HangingRoutineTest, RoutineTest])
+        HangingRoutineTest.released.clear()
+
+        try:
+            self.assertFalse(e.run())
+        finally:
+            HangingRoutineTest.released.set()
+
+        hanging = e.routines_instances()[0]
+        self.assertEqual("timeout", hanging.last_status)
+        self.assertEqual(
+            [call("HangingRoutineTest: Timeout after 0.05 seconds"),
+             call("Rout. Tést: Tést message")],
+            notifier.send.call_args_list)
+
+    def test_timed_out_run_finishing_late(self):
+        finished = threading.Event()
+
+        class LateRoutineTest(HangingRoutineTest):
+            def _execute(self):
+                self.released.wait(5)
+                self.checkpoint = "late"
+                self.notify("Late result")
+                return True
+
+            def _succeeded(self):
+                try:
+                    return super()._succeeded()
+                finally:
+                    finished.set()
+
+        notifier = Mock(name="NotifierTest")
+        store = {}
+        e = Executor(notifier, [LateRoutineTest], store)
+        HangingRoutineTest.released.clear()
+
+        self.assertFalse(e.run())
+        HangingRoutineTest.released.set()
+        self.assertTrue(finished.wait(5))
+
+        rt = e.routines_instances()[0]
+        self.assertEqual("timeout", rt.last_status)
+        self.assertIsNone(rt.last_execution)
+        self.assertIsNone(rt.checkpoint)
+        e.state.flush()
+        self.assertNotIn(rt.uid, store)
+
+        # Abandoned run doesn't send its messages
+        notifier.send.assert_called_once_with(
+            "LateRoutineTest: Timeout after 0.05 seconds")
+
+    def test_timeout_notification_error(self):
+        notifier = Mock(name="NotifierTest")
+        notifier.send.side_effect = Exception("Error")
+        e = Executor(notifier, [HangingRoutineTest, RoutineTest])
+        HangingRoutineTest.released.clear()
+
+        try:
+            self.assertFalse(e.run())
+        finally:
+            HangingRoutineTest.released.set()
+
+        hanging, after = e.routines_instances()
+        self.assertEqual("timeout", hanging.last_status)
+        self.assertEqual(2, notifier.send.call_count)
+
+    def test_run_dependencies(self):
+        notifier = Mock(name="NotifierTest")
+        e = Executor(notifier, [DatabaseReportRoutineTest,
+                                DatabaseQueryRoutineTest,
+                                DatabaseRoutineTest], {}, 4)
+
+        self.assertTrue(e.run())
+        self.assertEqual(
+            [call("DatabaseQueryRoutineTest: Query"),
+             call("DatabaseReportRoutineTest: Report")],
+            notifier.send.call_args_list)
+
+    def test_run_dependencies_with_failure(self):
+        notifier = Mock(name="NotifierTest")
+        e = Executor(notifier, [DatabaseReportRoutineTest,
+                                DatabaseQueryRoutineTest,
+                                DatabaseRoutineTest])
+
+        e.routines_instances()[2].up = False
+
+        self.assertFalse(e.run())
+        self.assertFalse(notifier.send.called)
+        self.assertEqual(["blocked", "blocked", "failure"],
+                         [rt.last_status for rt in e.routines_instances()])
+
+    def test_run_dependencies_without_barrier(self):
+        # The dependent of a fast routine doesn't wait for unrelated ones
+        SlowRoutineTest.released.clear()
+        e = Executor(Mock(name="NotifierTest"),
+                     [SlowRoutineTest, DatabaseRoutineTest,
+                      ReleasingRoutineTest], {}, 4)
+
+        self.assertTrue(e.run())
+
+    def test_run_dependencies_validation(self):
+        e = Executor(Mock(name="NotifierTest"), [DatabaseQueryRoutineTest])
+        self.assertRaises(ValueError, e.routines_instances)
+        self.assertFalse(e.run())
+
+        class CyclicRoutineTest(FailingRoutineTest):
+            depends_on = [DatabaseRoutineTest]
+
+        e = Executor(Mock(name="NotifierTest"),
+                     [CyclicRoutineTest, DatabaseRoutineTest])
+
+        DatabaseRoutineTest.depends_on = [CyclicRoutineTest]
+        try:
+            self.assertRaises(ValueError, e.routines_instances)
+        finally:
+            DatabaseRoutineTest.depends_on = ()
+
+    def test_run_forever(self):
+        notifier = Mock(name="NotifierTest")
+        e = Executor(notifier, [IntervalRoutineTest, RoutineTest])
+        notifier.send.side_effect = lambda message: e.stop()
+
+        interval_routine = e.routines_instances()[0]
+        interval_routine._set_last_execution()
+
+        e.run_forever()
+
+        notifier.send.assert_called_once_with("Rout. Tést: Tést message")
+        self.assertIsNotNone(interval_routine.next_execution)
+
+    def test_run_forever_saves_state_on_error(self):
+        store = {}
+        e = Executor(Mock(name="NotifierTest"), [RoutineTest], store)
+        e._next_due = Mock(side_effect=[0, ValueError("Invalid schedule")])
+
+        self.assertRaises(ValueError, e.run_forever)
+
+        self.assertIn(e.routines_instances()[0].uid, store)
+
 
 class NotifierTestCase(unittest.TestCase):
 
@@ -54,11 +465,28 @@ class NotifierTestCase(unittest.TestCase):
         message = "Test message"
         self.notifier.send(message)
 
-        followers = self.api.followers()
-        follower_id = followers[0].id
-
         self.api.send_direct_message.assert_called_once_with(
-            user_id=follower_id, text=message)
+            user_id=42, text=message)
+
+    def test_send_concurrently_with_failures(self):
+        set_api_followers(
+            self.api, [Follower("user{}".format(i), i) for i in range(10)])
+
+        error = Exception("Rate limit")
+
+        def send_direct_message(user_id, text):
+            if user_id == 3:
+                raise error
+
+        self.api.send_direct_message.side_effect = send_direct_message
+
+        notifier = Notifier(self.api, max_workers=4)
+        failures = notifier.send("Test message")
+
+        self.assertEqual(10, self.api.send_direct_message.call_count)
+        self.assertEqual(1, len(failures))
+        self.assertEqual(3, failures[0][0].id)
+        self.assertIs(error, failures[0][1])
 
     def test_send_with_empty_message(self):
         self.api.send_direct_message = Mock(
@@ -129,6 +557,47 @@ class RoutineTestCase(unittest.TestCase):
         self.routine.run()
         self.notifier.send.assert_called_once_with(self.test_message)
 
+    def test_next_execution(self):
+        self.assertIsNone(self.routine.next_execution)
+
+        self.routine.interval_minutes = 10
+        self.routine.run()
+
+        self.assertEqual(
+            datetime.timedelta(minutes=10),
+            self.routine.next_execution - self.routine.last_execution)
+
+    def test_checkpoint(self):
+        store = {}
+        routine = CheckpointRoutineTest(self.notifier, store)
+        self.assertIsNone(routine.checkpoint)
+
+        routine.run()
+        routine.run()
+        self.assertEqual(2, routine.checkpoint)
+        self.assertEqual("2", store[routine.uid + ":checkpoint"])
+
+        routine.fail = True
+        routine.run()
+        self.assertEqual(2, routine.checkpoint)
+
+        routine.clear_checkpoint()
+        self.assertIsNone(routine.checkpoint)
+
+    def test_checkpoint_in_process(self):
+        notifier = Mock(name="NotifierTest")
+        store = {}
+        e = Executor(
+            notifier, [ProcessCheckpointRoutineTest], store, processes=1)
+
+        try:
+            e.run()
+            e.run()
+        finally:
+            e.close()
+
+        self.assertEqual(2, e.routines_instances()[0].checkpoint)
+
     def test_execution_interval_is_none(self):
         self.routine.run()
         self.routine.run()
@@ -154,3 +623,16 @@ class ExecutorFactoryTestCase(unittest.TestCase):
     def test_create_default(self):
         executor = self.factory.create_default()
         self.assertIsInstance(executor, Executor)
+
+    def test_create_default_defers_twitter_api(self):
+        api = create_twitter_api_mock()
+        self.factory.store_backend = "memory"
+        self.factory._create_twitter_api = Mock(return_value=api)
+
+        executor = self.factory.create_default()
+        self.assertFalse(self.factory._create_twitter_api.called)
+
+        executor.notifier.send("Message")
+        executor.notifier.send("Message")
+        self.factory._create_twitter_api.assert_called_once_with()
+        self.assertEqual(2, api.send_direct_message.call_count)
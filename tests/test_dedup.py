@@ -0,0 +1,117 @@
+# -*- coding: UTF-8 -*-
+
+from twitter_monitor.dedup import Deduplicator, fingerprint
+from twitter_monitor.core import Executor, Routine
+from tests.test_core import FakeClock
+from mock import Mock
+import unittest
+
+
+class FailingRoutine(Routine):
+    interval_minutes = 0
+
+    def _execute(self):
+        self.notify("Service is down")
+        return True
+
+
+class DeduplicatorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.store = {}
+        self.dedup = Deduplicator(self.store, window_seconds=60,
+                                  max_entries=2, clock=self.clock)
+
+    def test_fingerprint(self):
+        self.assertEqual(fingerprint("a  b\n"), fingerprint("a b"))
+        self.assertNotEqual(fingerprint("a b"), fingerprint("a c"))
+
+    def test_suppress_repeated_messages(self):
+        self.assertEqual("down", self.dedup.check("uid", "down"))
+        self.assertIsNone(self.dedup.check("uid", "down"))
+        self.assertIsNone(self.dedup.check("uid", "down"))
+
+        self.assertEqual("down", self.dedup.check("other", "down"))
+
+    def test_flapping(self):
+        self.assertEqual("up", self.dedup.check("uid", "up"))
+        self.assertEqual("down", self.dedup.check("uid", "down"))
+        self.assertIsNone(self.dedup.check("uid", "up"))
+        self.assertIsNone(self.dedup.check("uid", "down"))
+
+    def test_summary_on_next_window(self):
+        self.dedup.check("uid", "down")
+        self.dedup.check("uid", "down")
+        self.dedup.check("uid", "down")
+
+        self.clock.now += 60
+
+        self.assertEqual("down (repeated 2 times)",
+                         self.dedup.check("uid", "down"))
+        self.assertIsNone(self.dedup.check("uid", "down"))
+
+    def test_expired(self):
+        self.dedup.check("uid", "down")
+        self.dedup.check("uid", "down")
+        self.dedup.check("uid", "up")
+
+        self.assertEqual([], self.dedup.expired())
+
+        self.clock.now += 60
+
+        self.assertEqual([("uid", "down (repeated 1 times)")],
+                         self.dedup.expired())
+        self.assertEqual(0, len(self.dedup))
+
+    def test_max_entries(self):
+        self.dedup.check("uid", "a")
+        self.dedup.check("uid", "b")
+        self.dedup.check("uid", "c")
+
+        self.assertEqual(2, len(self.dedup))
+        self.assertEqual("a", self.dedup.check("uid", "a"))
+
+    def test_persistence(self):
+        self.dedup.check("uid", "down")
+        self.dedup.check("uid", "down")
+        self.dedup.save()
+
+        dedup = Deduplicator(self.store, window_seconds=60,
+                             clock=self.clock)
+        self.assertIsNone(dedup.check("uid", "down"))
+
+        self.clock.now += 60
+        self.assertEqual([("uid", "down (repeated 2 times)")],
+                         dedup.expired())
+
+    def test_invalid_index(self):
+        self.store[Deduplicator.key] = "invalid"
+
+        self.assertEqual("down", self.dedup.check("uid", "down"))
+
+
+class ExecutorDedupTestCase(unittest.TestCase):
+
+    def test_repeated_messages_are_suppressed(self):
+        notifier = Mock(spec=["send"])
+        clock = FakeClock()
+        store = {}
+
+        dedup = Deduplicator(window_seconds=60, clock=clock)
+        executor = Executor(notifier, [FailingRoutine], store,
+                            deduplicator=dedup)
+        for _ in range(3):
+            executor.run()
+
+        notifier.send.assert_called_once_with(
+            "FailingRoutine: Service is down")
+        self.assertIs(store, dedup.store.store)
+
+        clock.now += 60
+        dedup = Deduplicator(window_seconds=60, clock=clock)
+        Executor(notifier, [FailingRoutine], store, deduplicator=dedup).run()
+
+        notifier.send.assert_called_with(
+            "FailingRoutine: Service is down (repeated 2 times)")
+        self.assertEqual(2, notifier.send.call_count)
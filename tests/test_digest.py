@@ -0,0 +1,88 @@
+# -*- coding: UTF-8 -*-
+
+from twitter_monitor.digest import DigestNotifier
+from twitter_monitor.core import Executor, Routine
+from tests.test_core import FakeClock
+from mock import Mock
+import unittest
+
+
+class UrgentRoutine(Routine):
+    interval_minutes = 0
+
+    def _execute(self):
+        self.notify("Routine")
+        self.notify("Urgent", urgent=True)
+        return True
+
+
+class DigestNotifierTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.notifier = Mock(spec=["send", "flush"])
+        self.digest = DigestNotifier(self.notifier, max_length=20,
+                                     max_hold_seconds=60, clock=self.clock)
+
+    def test_messages_are_buffered(self):
+        self.digest.send("a")
+        self.digest.send("b")
+
+        self.notifier.send.assert_not_called()
+
+        self.digest.flush()
+
+        self.notifier.send.assert_called_once_with("a\nb", None)
+        self.notifier.flush.assert_called_once_with()
+
+    def test_urgent_messages_skip_the_buffer(self):
+        self.digest.send("a")
+        self.digest.send("urgent", [1], urgent=True)
+
+        self.notifier.send.assert_called_once_with("urgent", [1])
+
+    def test_coalesce_by_recipients(self):
+        self.digest.send("a", [1, 2])
+        self.digest.send("b")
+        self.digest.send("c", [2, 1])
+
+        self.digest.flush()
+
+        self.assertEqual(2, self.notifier.send.call_count)
+        self.notifier.send.assert_any_call("a\nc", [1, 2])
+        self.notifier.send.assert_any_call("b", None)
+
+    def test_max_length(self):
+        self.digest.send("a" * 15)
+        self.digest.send("b" * 10)
+        self.digest.send("c" * 25)
+
+        self.digest.flush()
+
+        self.assertEqual(
+            ["a" * 15, "b" * 10, "c" * 20, "c" * 5],
+            [c[0][0] for c in self.notifier.send.call_args_list])
+
+    def test_max_hold_seconds(self):
+        self.digest.send("a")
+        self.clock.now += 30
+        self.digest.send("b")
+        self.notifier.send.assert_not_called()
+
+        self.clock.now += 30
+        self.digest.send("c")
+
+        self.notifier.send.assert_called_once_with("a\nb\nc", None)
+
+    def test_flush_empty(self):
+        self.digest.flush()
+
+        self.notifier.send.assert_not_called()
+
+    def test_executor_flushes_digest(self):
+        digest = DigestNotifier(self.notifier)
+        Executor(digest, [UrgentRoutine]).run()
+
+        self.assertEqual(
+            ["UrgentRoutine: Urgent", "UrgentRoutine: Routine"],
+            [c[0][0] for c in self.notifier.send.call_args_list])
@@ -0,0 +1,78 @@
+# -*- coding: UTF-8 -*-
+
+from twitter_monitor.followers import FollowerCache, Follower
+from tests.test_core import create_twitter_api_mock, set_api_followers
+from mock import Mock
+import unittest
+
+
+class FollowerCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.api = create_twitter_api_mock()
+        self.followers = [
+            Follower(i, "user{}".format(i)) for i in range(250)]
+        set_api_followers(self.api, self.followers, page_size=100)
+
+        self.store = {}
+        self.cache = FollowerCache(self.api, self.store, background=False)
+
+    def test_get_pages_all_followers(self):
+        self.assertEqual(self.followers, self.cache.get())
+        self.assertEqual(3, self.api.followers_ids.call_count)
+        self.assertEqual(3, self.api.lookup_users.call_count)
+
+    def test_get_uses_cache(self):
+        self.cache.get()
+        self.cache.get()
+
+        self.assertEqual(3, self.api.followers_ids.call_count)
+
+    def test_get_loads_persisted_followers(self):
+        self.cache.get()
+
+        cache = FollowerCache(self.api, self.store)
+        self.assertEqual(self.followers, cache.get())
+        self.assertEqual(3, self.api.followers_ids.call_count)
+
+    def test_refresh_looks_up_only_new_followers(self):
+        self.cache.get()
+        self.api.lookup_users.reset_mock()
+
+        new_follower = Follower(1000, "new_user")
+        set_api_followers(
+            self.api, self.followers[1:] + [new_follower], page_size=100)
+
+        self.cache.ttl_seconds = 0
+        followers = self.cache.get()
+
+        self.assertEqual(self.followers[1:] + [new_follower], followers)
+        self.api.lookup_users.assert_called_once_with(user_ids=[1000])
+
+    def test_listeners(self):
+        listener = Mock()
+        self.cache.add_listener(listener)
+
+        self.cache.get()
+        listener.assert_called_once_with(self.followers, [])
+
+        new_follower = Follower(1000, "new_user")
+        set_api_followers(
+            self.api, self.followers[1:] + [new_follower], page_size=100)
+        self.cache.refresh()
+
+        listener.assert_called_with([new_follower], [self.followers[0]])
+
+        other = Mock()
+        self.cache.add_listener(other)
+        other.assert_called_once_with(self.cache.get(), [])
+
+    def test_listeners_on_load(self):
+        self.cache.get()
+
+        listener = Mock()
+        cache = FollowerCache(self.api, self.store)
+        cache.add_listener(listener)
+        cache.get()
+
+        listener.assert_called_once_with(self.followers, [])
@@ -0,0 +1,111 @@
+# -*- coding: UTF-8 -*-
+
+from twitter_monitor.history import History, percentile
+from twitter_monitor.core import Executor, Routine
+from mock import Mock
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class FailingRoutine(Routine):
+    interval_minutes = 0
+
+    def _execute(self):
+        return False
+
+
+class HistoryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.history = History(self.dir, capacity=5)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+
+        self.assertEqual(50, percentile(values, 50))
+        self.assertEqual(99, percentile(values, 99))
+        self.assertEqual(1, percentile([1], 95))
+        self.assertIsNone(percentile([], 50))
+
+    def test_records(self):
+        self.history.record("uid", 100, 0.5, "success")
+        self.history.record("uid", 200, 1.5, "failure")
+
+        self.assertEqual([(100, 0.5, "success"), (200, 1.5, "failure")],
+                         list(self.history.records("uid")))
+        self.assertEqual([(200, 1.5, "failure")],
+                         list(self.history.records("uid", since=150)))
+        self.assertEqual([], list(self.history.records("other")))
+
+    def test_ring_buffer(self):
+        for i in range(12):
+            self.history.record("uid", i, i, "success")
+
+        self.assertEqual(
+            [7, 8, 9, 10, 11],
+            [r[0] for r in self.history.records("uid")])
+
+        size = os.path.getsize(os.path.join(self.dir, "uid.hist"))
+
+        self.history.record("uid", 12, 12, "success")
+        self.assertEqual(
+            size, os.path.getsize(os.path.join(self.dir, "uid.hist")))
+
+    def test_records_in_blocks(self):
+        self.history.block_size = 2
+
+        for i in range(8):
+            self.history.record("uid", i, i, "success")
+
+        self.assertEqual(
+            [3, 4, 5, 6, 7],
+            [r[0] for r in self.history.records("uid")])
+
+    def test_stats(self):
+        self.history.capacity = 100
+        for i in range(1, 21):
+            status = "failure" if i % 5 == 0 else "success"
+            self.history.record("uid", 1000 + i, i, status)
+
+        self.history.record("uid", 1021, 0, "skipped")
+
+        stats = self.history.stats("uid", now=1021)
+        self.assertEqual(20, stats.runs)
+        self.assertEqual(4, stats.failures)
+        self.assertEqual(0.2, stats.failure_rate)
+        self.assertEqual((10, 19, 20), (stats.p50, stats.p95, stats.p99))
+
+        stats = self.history.stats("uid", window_seconds=10, now=1021)
+        self.assertEqual(10, stats.runs)
+        self.assertEqual(15, stats.p50)
+
+    def test_stats_without_runs(self):
+        stats = self.history.stats("uid")
+
+        self.assertEqual(0, stats.runs)
+        self.assertEqual(0.0, stats.failure_rate)
+        self.assertIsNone(stats.p95)
+
+    def test_invalid_file(self):
+        with open(os.path.join(self.dir, "uid.hist"), "wb") as f:
+            f.write(b"invalid" * 4)
+
+        self.assertRaises(ValueError, self.history.record,
+                          "uid", 0, 0, "success")
+
+    def test_executor_records_runs(self):
+        executor = Executor(Mock(), [FailingRoutine], history=self.history)
+        executor.run()
+        executor.run()
+
+        uid = executor.routines_instances()[0].uid
+        stats = self.history.stats(uid)
+
+        self.assertEqual(2, stats.runs)
+        self.assertEqual(1.0, stats.failure_rate)
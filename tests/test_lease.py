@@ -0,0 +1,74 @@
+# -*- coding: UTF-8 -*-
+
+from twitter_monitor.lease import SQLiteLeaseManager
+from twitter_monitor.core import Executor
+from tests.test_core import RoutineTest
+from mock import Mock
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class SQLiteLeaseManagerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "leases.db")
+        self.node1 = SQLiteLeaseManager(self.path, "node1")
+        self.node2 = SQLiteLeaseManager(self.path, "node2")
+
+    def tearDown(self):
+        self.node1.close()
+        self.node2.close()
+        shutil.rmtree(self.dir)
+
+    def test_acquire(self):
+        self.assertEqual(1, self.node1.acquire("uid", 60, now=0))
+        self.assertIsNone(self.node2.acquire("uid", 60, now=30))
+
+        # Renew
+        self.assertEqual(1, self.node1.acquire("uid", 60, now=50))
+        self.assertIsNone(self.node2.acquire("uid", 60, now=100))
+
+    def test_expired_lease_is_taken_over(self):
+        self.node1.acquire("uid", 60, now=0)
+
+        self.assertEqual(2, self.node2.acquire("uid", 60, now=61))
+        self.assertFalse(self.node1.is_valid("uid", 1, now=61))
+        self.assertTrue(self.node2.is_valid("uid", 2, now=61))
+
+    def test_release(self):
+        self.node1.acquire("uid", 60, now=0)
+        self.node1.release("uid", 1)
+
+        self.assertEqual(2, self.node2.acquire("uid", 60, now=1))
+
+    def test_executor_runs_routine_in_one_node(self):
+        notifier = Mock(name="NotifierTest")
+
+        e1 = Executor(notifier, [RoutineTest], {}, leases=self.node1)
+        e2 = Executor(notifier, [RoutineTest], {}, leases=self.node2)
+
+        self.assertTrue(e1.run())
+        self.assertTrue(e2.run())
+
+        notifier.send.assert_called_once_with("Rout. Tést: Tést message")
+        self.assertEqual(1, e1.routines_instances()[0].lease_token)
+
+    def test_lost_lease_discards_results(self):
+        notifier = Mock(name="NotifierTest")
+        leases = Mock(name="Leases")
+        leases.acquire.return_value = 1
+        leases.is_valid.return_value = False
+        store = {}
+
+        e = Executor(notifier, [RoutineTest], store, leases=leases)
+
+        self.assertFalse(e.run())
+
+        rt = e.routines_instances()[0]
+        leases.is_valid.assert_called_with(rt.uid, 1)
+        self.assertFalse(notifier.send.called)
+        self.assertNotIn(rt.uid, store)
+        self.assertEqual("failure", rt.last_status)
@@ -0,0 +1,129 @@
+# -*- coding: UTF-8 -*-
+
+from twitter_monitor.metrics import Registry
+from twitter_monitor.core import Executor, Notifier
+from twitter_monitor.followers import FollowerCache
+from tests.test_core import RoutineTest, FailingRoutineTest, \
+    IntervalRoutineTest, create_twitter_api_mock
+from mock import Mock
+from urllib.request import urlopen
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class RegistryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter(self):
+        counter = self.registry.counter("runs_total", "Runs", ["status"])
+        counter.inc(status="success")
+        counter.inc(2, status="fail\"ure")
+
+        self.assertIs(counter, self.registry.counter("runs_total", "Runs"))
+        self.assertEqual(
+            "# HELP runs_total Runs\n"
+            "# TYPE runs_total counter\n"
+            "runs_total{status=\"fail\\\"ure\"} 2\n"
+            "runs_total{status=\"success\"} 1\n",
+            self.registry.render())
+
+    def test_histogram(self):
+        histogram = self.registry.histogram(
+            "duration_seconds", "Duration", buckets=(0.1, 1))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+
+        self.assertEqual(
+            "# HELP duration_seconds Duration\n"
+            "# TYPE duration_seconds histogram\n"
+            "duration_seconds_bucket{le=\"0.1\"} 1\n"
+            "duration_seconds_bucket{le=\"1.0\"} 2\n"
+            "duration_seconds_bucket{le=\"+Inf\"} 3\n"
+            "duration_seconds_sum 5.55\n"
+            "duration_seconds_count 3\n",
+            self.registry.render())
+
+    def test_type_conflict(self):
+        self.registry.counter("metric", "Metric")
+        self.assertRaises(
+            ValueError, self.registry.histogram, "metric", "Metric")
+
+    def test_write_textfile(self):
+        dir = tempfile.mkdtemp()
+
+        try:
+            path = os.path.join(dir, "metrics.prom")
+            self.registry.counter("runs_total", "Runs").inc()
+            self.registry.write_textfile(path)
+
+            with open(path) as f:
+                self.assertEqual(self.registry.render(), f.read())
+        finally:
+            shutil.rmtree(dir)
+
+    def test_serve(self):
+        self.registry.counter("runs_total", "Runs").inc()
+        server = self.registry.serve(0, "127.0.0.1")
+
+        try:
+            url = "http://127.0.0.1:{}/metrics".format(server.server_port)
+            with urlopen(url) as response:
+                self.assertEqual(
+                    self.registry.render(), response.read().decode("utf-8"))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+class InstrumentationTestCase(unittest.TestCase):
+
+    def test_executor_metrics(self):
+        registry = Registry()
+        e = Executor(Mock(name="NotifierTest"),
+                     [RoutineTest, FailingRoutineTest, IntervalRoutineTest],
+                     {}, metrics=registry)
+
+        e.run()
+        e.run()
+
+        runs = registry.counter("twitter_monitor_routine_runs_total", "")
+        self.assertEqual(2, runs.value(routine="Routine Tést",
+                                       status="success"))
+        self.assertEqual(2, runs.value(routine="FailingRoutineTest",
+                                       status="failure"))
+        self.assertEqual(1, runs.value(routine="IntervalRoutineTest",
+                                       status="skipped"))
+
+        durations = registry.histogram(
+            "twitter_monitor_routine_duration_seconds", "")
+        self.assertEqual(2, durations.count(routine="Routine Tést"))
+
+    def test_notifier_metrics(self):
+        registry = Registry()
+        api = create_twitter_api_mock()
+        api.send_direct_message.side_effect = Exception("Error")
+
+        Notifier(api, metrics=registry).send("Message")
+
+        calls = registry.counter("twitter_monitor_api_calls_total", "")
+        errors = registry.counter("twitter_monitor_api_errors_total", "")
+        self.assertEqual(1, calls.value(method="send_direct_message"))
+        self.assertEqual(1, errors.value(method="send_direct_message"))
+        self.assertEqual(1, calls.value(method="followers_ids"))
+        self.assertEqual(1, calls.value(method="lookup_users"))
+
+    def test_follower_cache_metrics(self):
+        registry = Registry()
+        api = create_twitter_api_mock()
+        api.followers_ids.side_effect = Exception("Error")
+
+        cache = FollowerCache(api, metrics=registry)
+        self.assertRaises(Exception, cache.refresh)
+
+        errors = registry.counter("twitter_monitor_api_errors_total", "")
+        self.assertEqual(1, errors.value(method="followers_ids"))
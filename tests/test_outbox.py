@@ -0,0 +1,175 @@
+# -*- coding: UTF-8 -*-
+
+from twitter_monitor.outbox import DurableQueue, Outbox
+from tests.test_core import Follower
+from mock import Mock
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+
+class DurableQueueTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "queue.db")
+        self.queue = DurableQueue(self.path)
+
+    def tearDown(self):
+        self.queue.close()
+        shutil.rmtree(self.dir)
+
+    def test_put_get_ack(self):
+        self.queue.put("Message", [1, 2], now=10)
+
+        self.assertIsNone(self.queue.get(now=5))
+
+        id, message, recipient_ids, attempts, audience = \
+            self.queue.get(now=10)
+        self.assertEqual(("Message", [1, 2], 0, None),
+                         (message, recipient_ids, attempts, audience))
+
+        self.queue.ack(id)
+        self.assertEqual(0, len(self.queue))
+
+    def test_messages_survive_reopen(self):
+        self.queue.put("Message")
+        self.queue.close()
+
+        self.queue = DurableQueue(self.path)
+        self.assertEqual("Message", self.queue.get()[1])
+
+    def test_retry(self):
+        self.queue.put("Message", now=10)
+        id = self.queue.get(now=10)[0]
+
+        self.queue.retry(id, 20, [3])
+
+        self.assertIsNone(self.queue.get(now=15))
+        self.assertEqual(20, self.queue.next_attempt())
+        self.assertEqual((id, "Message", [3], 1, None),
+                         self.queue.get(now=20))
+
+    def test_get_claims_message(self):
+        self.queue.put("Message", now=10)
+        id = self.queue.get(now=10)[0]
+
+        self.assertIsNone(self.queue.get(now=10))
+        self.assertIsNone(DurableQueue(self.path).get(now=10))
+
+        # Not acked in time, so it's delivered again
+        self.assertEqual(id, self.queue.get(now=10 + 300)[0])
+
+    def test_hold_renews_claim(self):
+        queue = DurableQueue(self.path, claim_seconds=0.2)
+        self.queue.put("Message")
+        id = queue.get()[0]
+
+        with queue.hold(id):
+            time.sleep(0.5)
+            self.assertIsNone(self.queue.get())
+
+        queue.ack(id)
+        queue.close()
+
+    def test_audience(self):
+        self.queue.put("Message", audience=("db", "infra"))
+
+        self.assertEqual(["db", "infra"], self.queue.get()[4])
+
+
+class OutboxTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.notifier = Mock(name="Notifier")
+        self.notifier.send.return_value = []
+        self.queue = DurableQueue(":memory:")
+        self.outbox = Outbox(self.notifier, self.queue, max_attempts=2)
+
+    def test_send_only_enqueues(self):
+        self.outbox.send("Message")
+
+        self.assertFalse(self.notifier.send.called)
+        self.assertEqual(1, len(self.queue))
+
+    def test_deliver_pending(self):
+        self.outbox.send("Message")
+        self.outbox.deliver_pending()
+
+        self.notifier.send.assert_called_once_with("Message", None)
+        self.assertEqual(0, len(self.queue))
+
+    def test_audience_resolved_on_delivery(self):
+        self.outbox.send("Message", audience=("db",))
+        self.assertFalse(self.notifier.recipients.called)
+
+        self.outbox.deliver_pending()
+        self.notifier.send.assert_called_once_with(
+            "Message", None, audience=("db",))
+
+    def test_slow_delivery_isnt_claimed_again(self):
+        self.queue.claim_seconds = 0.2
+        delivered = []
+
+        def send(message, recipient_ids):
+            time.sleep(0.5)  # Waiting for rate limiter
+            delivered.append(message)
+            return []
+
+        self.notifier.send.side_effect = send
+
+        self.outbox.start()
+        self.outbox.send("Message")
+        time.sleep(0.3)
+        self.outbox.flush()
+        self.outbox.stop(timeout=5)
+
+        self.assertEqual(["Message"], delivered)
+
+    def test_retry_failed_recipients(self):
+        self.notifier.send.side_effect = [
+            [(Follower("user", 7), Exception("Error"))], []]
+
+        self.outbox.send("Message")
+        self.outbox.deliver_pending()
+        self.assertEqual(1, len(self.queue))
+
+        self.outbox.deliver_pending(now=time.time() + 3600)
+        self.notifier.send.assert_called_with("Message", [7])
+        self.assertEqual(0, len(self.queue))
+
+    def test_discard_after_max_attempts(self):
+        self.notifier.send.side_effect = Exception("Error")
+
+        self.outbox.send("Message")
+        self.outbox.deliver_pending()
+        self.outbox.deliver_pending(now=time.time() + 3600)
+
+        self.assertEqual(2, self.notifier.send.call_count)
+        self.assertEqual(0, len(self.queue))
+
+    def test_backoff(self):
+        self.assertTrue(2.5 <= self.outbox.backoff(0) <= 7.5)
+        self.assertTrue(20 <= self.outbox.backoff(3) <= 60)
+        self.assertTrue(self.outbox.backoff(30) <= 5400)
+
+    def test_worker(self):
+        self.outbox.start()
+        self.outbox.send("Message")
+        self.outbox.stop(timeout=5)
+
+        self.outbox.deliver_pending()
+        self.notifier.send.assert_called_once_with("Message", None)
+
+    def test_worker_and_flush_deliver_once(self):
+        self.notifier.send.side_effect = lambda *args: time.sleep(0.2) or []
+
+        self.outbox.start()
+        self.outbox.send("Message")
+        time.sleep(0.05)
+        self.outbox.flush()
+        self.outbox.stop(timeout=5)
+
+        self.assertEqual(1, self.notifier.send.call_count)
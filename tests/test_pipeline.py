@@ -0,0 +1,202 @@
+# -*- coding: UTF-8 -*-
+
+from twitter_monitor.pipeline import DeliveryPipeline
+from twitter_monitor.outbox import DurableQueue
+from twitter_monitor.core import Executor, Routine
+from mock import Mock
+import threading
+import unittest
+
+
+class SlowNotifier:
+    """
+    Notifier blocking deliveries until released.
+    """
+
+    def __init__(self):
+        self.messages = []
+        self.release = threading.Event()
+
+    def send(self, message, recipient_ids=None, **options):
+        self.release.wait(5)
+        self.messages.append(message)
+        return []
+
+
+class PipelineRoutine(Routine):
+    interval_minutes = 0
+
+    def _execute(self):
+        self.notify("First")
+        self.notify("Second")
+        return True
+
+
+class DeliveryPipelineTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.notifier = SlowNotifier()
+
+    def tearDown(self):
+        self.notifier.release.set()
+
+    def test_invalid_policy(self):
+        self.assertRaises(ValueError, DeliveryPipeline, self.notifier,
+                          policy="invalid")
+        self.assertRaises(ValueError, DeliveryPipeline, self.notifier,
+                          policy="spill")
+
+    def test_send_without_workers(self):
+        notifier = Mock(spec=["send"])
+        notifier.send.return_value = []
+
+        DeliveryPipeline(notifier).send("Message", [1], audience=("db",))
+
+        notifier.send.assert_called_once_with("Message", [1],
+                                              audience=("db",))
+
+    def test_send_doesnt_wait_delivery(self):
+        pipeline = DeliveryPipeline(self.notifier, workers=2)
+        pipeline.start()
+
+        pipeline.send("a")
+        pipeline.send("b")
+        self.assertEqual([], self.notifier.messages)
+
+        self.notifier.release.set()
+        pipeline.flush()
+
+        self.assertEqual(["a", "b"], sorted(self.notifier.messages))
+        pipeline.stop()
+
+    def test_drop_oldest(self):
+        pipeline = DeliveryPipeline(self.notifier, workers=1, max_size=2,
+                                    policy="drop_oldest")
+        pipeline._threads = [Mock()]  # Workers not delivering yet
+
+        for message in ["a", "b", "c", "d"]:
+            pipeline.send(message)
+
+        self.assertEqual(2, pipeline.dropped)
+
+        self.notifier.release.set()
+        pipeline._threads = []
+        pipeline.flush()
+
+        self.assertEqual(["c", "d"], self.notifier.messages)
+
+    def test_spill(self):
+        spill = DurableQueue(":memory:")
+        pipeline = DeliveryPipeline(self.notifier, workers=1, max_size=1,
+                                    policy="spill", spill=spill)
+        pipeline._threads = [Mock()]  # Workers not delivering yet
+
+        pipeline.send("a")
+        pipeline.send("b", [1])
+        pipeline.send("c")
+
+        self.assertEqual(1, len(pipeline))
+        self.assertEqual(2, len(spill))
+
+        self.notifier.release.set()
+        pipeline._threads = []
+        pipeline.flush()
+
+        self.assertEqual(["a", "b", "c"], self.notifier.messages)
+        self.assertEqual(0, len(spill))
+
+    def test_spill_keeps_audience(self):
+        notifier = Mock(spec=["send"])
+        notifier.send.return_value = []
+        pipeline = DeliveryPipeline(notifier, spill=DurableQueue(":memory:"))
+
+        pipeline._spill(("Message", None, {"audience": ("db",)}))
+        pipeline.flush()
+
+        notifier.send.assert_called_once_with("Message", None,
+                                              audience=("db",))
+
+    def test_spilled_message_kept_on_error(self):
+        notifier = Mock(spec=["send"])
+        notifier.send.side_effect = Exception("Error")
+        spill = DurableQueue(":memory:")
+        pipeline = DeliveryPipeline(notifier, spill=spill)
+
+        pipeline._spill(("Message", None, {}))
+        pipeline.flush()
+
+        self.assertEqual(1, len(spill))
+
+    def test_spilled_message_discarded_after_max_attempts(self):
+        notifier = Mock(spec=["send"])
+        notifier.send.side_effect = Exception("Error")
+        spill = DurableQueue(":memory:", claim_seconds=0)
+        pipeline = DeliveryPipeline(notifier, spill=spill, max_attempts=2)
+
+        pipeline._spill(("Message", None, {}))
+        pipeline.flush()
+        pipeline.flush()
+
+        self.assertEqual(2, notifier.send.call_count)
+        self.assertEqual(0, len(spill))
+
+    def test_flush_without_wait(self):
+        pipeline = DeliveryPipeline(self.notifier, workers=1)
+        pipeline.start()
+        pipeline.send("a")
+
+        pipeline.flush(wait=False)
+        self.assertEqual([], self.notifier.messages)
+
+        self.notifier.release.set()
+        pipeline.stop()
+        self.assertEqual(["a"], self.notifier.messages)
+
+    def test_stop_drains_queue(self):
+        pipeline = DeliveryPipeline(self.notifier, workers=2)
+        pipeline.start()
+
+        for message in ["a", "b", "c"]:
+            pipeline.send(message)
+
+        self.notifier.release.set()
+        pipeline.stop()
+
+        self.assertEqual(["a", "b", "c"], sorted(self.notifier.messages))
+
+    def test_stop_without_drain_spills(self):
+        spill = DurableQueue(":memory:")
+        pipeline = DeliveryPipeline(self.notifier, spill=spill)
+        pipeline._threads = []
+        pipeline._queue.put(("a", None, {}))
+
+        pipeline.stop(drain=False)
+
+        self.assertEqual([], self.notifier.messages)
+        self.assertEqual(1, len(spill))
+
+    def test_executor(self):
+        pipeline = DeliveryPipeline(self.notifier, workers=2)
+        pipeline.start()
+
+        self.notifier.release.set()
+        Executor(pipeline, [PipelineRoutine]).run()
+
+        self.assertEqual(
+            ["PipelineRoutine: First", "PipelineRoutine: Second"],
+            sorted(self.notifier.messages))
+        pipeline.stop()
+
+    def test_run_forever_stops_workers(self):
+        pipeline = DeliveryPipeline(self.notifier, workers=2)
+        pipeline.start()
+
+        e = Executor(pipeline, [PipelineRoutine])
+        self.notifier.release.set()
+        self.notifier.send = Mock(
+            side_effect=lambda message, *args, **kwargs: e.stop() or [])
+
+        e.run_forever()
+
+        self.assertEqual(2, self.notifier.send.call_count)
+        self.assertEqual([], pipeline._threads)
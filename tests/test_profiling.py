@@ -0,0 +1,97 @@
+# -*- coding: UTF-8 -*-
+
+from twitter_monitor.profiling import Profiler
+from twitter_monitor.core import Executor, Routine
+from twitter_monitor.aio import AsyncExecutor, AsyncRoutine
+from tests.test_core import RoutineTest
+from mock import Mock, patch
+import asyncio
+import os
+import pstats
+import shutil
+import tempfile
+import time
+import unittest
+
+
+class SlowRoutineTest(Routine):
+
+    def _execute(self):
+        time.sleep(0.2)
+        return True
+
+
+class SlowAsyncRoutineTest(AsyncRoutine):
+
+    async def _execute(self):
+        await asyncio.sleep(0.2)
+        return True
+
+
+class ProfilerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_profile_selected_routines(self):
+        profiler = Profiler(self.dir, routines=[SlowRoutineTest])
+        e = Executor(Mock(name="NotifierTest"),
+                     [SlowRoutineTest, RoutineTest], {}, profiler=profiler)
+
+        self.assertTrue(e.run())
+
+        slow, fast = e.routines_instances()
+        self.assertTrue(os.path.exists(profiler.path(slow)))
+        self.assertFalse(os.path.exists(profiler.path(fast)))
+
+        stats = pstats.Stats(profiler.path(slow))
+        self.assertTrue(any(
+            name == "_execute" for _, _, name in stats.stats))
+
+    def test_profiler_busy(self):
+        profiler = Profiler(self.dir)
+        rt = SlowRoutineTest(Mock(name="NotifierTest"), {})
+
+        with patch("cProfile.Profile") as profile:
+            profile.return_value.enable.side_effect = ValueError(
+                "Another profiling tool is already active")
+
+            self.assertTrue(profiler.run(rt))
+
+        self.assertFalse(os.path.exists(profiler.path(rt)))
+
+    def test_slow_routines_report(self):
+        profiler = Profiler(slow_threshold=0.1)
+        e = Executor(Mock(name="NotifierTest"),
+                     [RoutineTest, SlowRoutineTest], {}, profiler=profiler)
+
+        with self.assertLogs("twitter_monitor.profiling", "WARNING") as logs:
+            e.run()
+
+        self.assertIn("SlowRoutineTest", logs.output[0])
+        self.assertNotIn("Routine Tést", logs.output[0])
+        self.assertEqual([], profiler.report())
+
+    def test_slow_async_routines_report(self):
+        profiler = Profiler(slow_threshold=0.1)
+        e = AsyncExecutor(Mock(name="NotifierTest"), [SlowAsyncRoutineTest],
+                          profiler=profiler)
+
+        with self.assertLogs("twitter_monitor.profiling", "WARNING") as logs:
+            e.run()
+
+        self.assertIn("SlowAsyncRoutineTest", logs.output[0])
+
+    def test_report(self):
+        profiler = Profiler(slow_threshold=0.1)
+        rt = SlowRoutineTest(Mock(name="NotifierTest"), {})
+
+        profiler.record(rt, 0.2)
+        profiler.record(RoutineTest(Mock(name="NotifierTest"), {}), 0.01)
+
+        report = profiler.report()
+        self.assertEqual(1, len(report))
+        self.assertEqual(str(rt), report[0][1])
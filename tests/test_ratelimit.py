@@ -0,0 +1,89 @@
+# -*- coding: UTF-8 -*-
+
+from twitter_monitor.ratelimit import TokenBucket, RateLimiter
+from tests.test_core import FakeClock
+from mock import Mock
+import unittest
+
+
+class RateLimitError(Exception):
+
+    def __init__(self, reset=None):
+        super().__init__("Rate limit exceeded")
+        headers = {} if reset is None else {"x-rate-limit-reset": str(reset)}
+        self.response = Mock(status_code=429, headers=headers)
+
+
+class TokenBucketTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.bucket = TokenBucket(2, 3, self.clock, self.clock.sleep)
+
+    def test_acquire_burst(self):
+        for i in range(3):
+            self.bucket.acquire()
+
+        self.assertEqual(1000.0, self.clock.now)
+
+    def test_acquire_paced(self):
+        for i in range(5):
+            self.bucket.acquire()
+
+        self.assertAlmostEqual(1001.0, self.clock.now)
+
+    def test_pause_until(self):
+        for i in range(5):
+            self.bucket.acquire()
+
+        self.bucket.pause_until(1010.0)
+        self.bucket.acquire()
+
+        self.assertAlmostEqual(1010.0, self.clock.now)
+
+        self.bucket.acquire()
+        self.assertAlmostEqual(1010.5, self.clock.now)
+
+    def test_state_is_persisted(self):
+        store = {}
+        bucket = TokenBucket(2, 3, self.clock, self.clock.sleep, store)
+        for i in range(3):
+            bucket.acquire()
+
+        # A new execution doesn't start with a full bucket
+        bucket = TokenBucket(2, 3, self.clock, self.clock.sleep, store)
+        bucket.acquire()
+
+        self.assertAlmostEqual(1000.5, self.clock.now)
+
+
+class RateLimiterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        bucket = TokenBucket(10, 10, self.clock, self.clock.sleep)
+        self.limiter = RateLimiter(bucket, max_retries=2, clock=self.clock)
+
+    def test_call(self):
+        func = Mock(return_value="ok")
+
+        self.assertEqual("ok", self.limiter.call(func, 1, text="a"))
+        func.assert_called_once_with(1, text="a")
+
+    def test_call_waits_for_reset(self):
+        func = Mock(side_effect=[RateLimitError(1100), "ok"])
+
+        self.assertEqual("ok", self.limiter.call(func))
+        self.assertGreaterEqual(self.clock.now, 1100.0)
+
+    def test_call_gives_up_after_retries(self):
+        func = Mock(side_effect=RateLimitError())
+
+        self.assertRaises(RateLimitError, self.limiter.call, func)
+        self.assertEqual(3, func.call_count)
+
+    def test_call_raises_other_errors(self):
+        func = Mock(side_effect=ValueError("Other error"))
+
+        self.assertRaises(ValueError, self.limiter.call, func)
+        self.assertEqual(1, func.call_count)
@@ -0,0 +1,174 @@
+# -*- coding: UTF-8 -*-
+
+from twitter_monitor.routing import AudienceIndex
+from twitter_monitor.followers import Follower, FollowerCache
+from twitter_monitor.digest import DigestNotifier
+from twitter_monitor.core import Executor, Notifier, Routine
+from twitter_monitor.dedup import Deduplicator
+from tests.test_core import create_twitter_api_mock, set_api_followers
+from tests.test_core import FakeClock
+from mock import Mock
+import unittest
+
+
+class DatabaseRoutine(Routine):
+    interval_minutes = 0
+    audience = ("db",)
+
+    def _execute(self):
+        self.notify("Disk almost full")
+        return True
+
+
+class InfraRoutine(Routine):
+    interval_minutes = 0
+    audience = "infra"
+
+    def _execute(self):
+        self.notify("Load average high")
+        return True
+
+
+class AudienceIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.index = AudienceIndex({
+            "Alice": ["db", "infra"],
+            "bob": ["web"],
+        })
+        self.index.followers_changed(
+            [Follower(1, "alice"), Follower(2, "Bob"), Follower(3, "carol")],
+            [])
+
+    def test_recipients(self):
+        self.assertEqual({1}, self.index.recipients(["db"]))
+        self.assertEqual({1, 2}, self.index.recipients(["infra", "web"]))
+        self.assertEqual(set(), self.index.recipients(["unknown"]))
+
+    def test_followers_changed(self):
+        self.index.followers_changed(
+            [Follower(4, "bob")], [Follower(1, "alice")])
+
+        self.assertEqual(set(), self.index.recipients(["db"]))
+        self.assertEqual({2, 4}, self.index.recipients(["web"]))
+
+    def test_set_tags(self):
+        self.index.set_tags("carol", ["db"])
+        self.index.set_tags("alice", ["infra"])
+
+        self.assertEqual({3}, self.index.recipients(["db"]))
+        self.assertEqual({1}, self.index.recipients(["infra"]))
+
+        self.index.set_tags("alice", [])
+        self.assertEqual(set(), self.index.recipients(["infra"]))
+
+
+class NotifierRoutingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.api = create_twitter_api_mock()
+        set_api_followers(self.api, [
+            Follower(1, "alice"), Follower(2, "bob"), Follower(3, "carol")])
+
+        self.audiences = AudienceIndex({"alice": ["db"], "bob": ["web"]})
+        self.notifier = Notifier(self.api, followers=FollowerCache(self.api),
+                                 audiences=self.audiences)
+
+    def recipients(self):
+        return [c[1]["user_id"]
+                for c in self.api.send_direct_message.call_args_list]
+
+    def test_send_to_audience(self):
+        self.notifier.send("Message", audience=["db"])
+
+        self.assertEqual([1], self.recipients())
+
+    def test_send_to_audience_and_recipients(self):
+        self.notifier.send("Message", [2, 3], audience=["db", "web"])
+
+        self.assertEqual([2], self.recipients())
+
+    def test_send_without_audience(self):
+        self.notifier.send("Message")
+
+        self.assertEqual([1, 2, 3], self.recipients())
+
+    def test_without_index(self):
+        notifier = Notifier(self.api, followers=FollowerCache(self.api))
+        notifier.send("Message", audience=["db"])
+
+        self.assertEqual([1, 2, 3], self.recipients())
+
+    def test_routine_audience(self):
+        Executor(self.notifier, [DatabaseRoutine]).run()
+
+        self.assertEqual([1], self.recipients())
+
+    def test_routine_audience_string(self):
+        Executor(self.notifier, [InfraRoutine]).run()
+
+        self.assertEqual([], self.recipients())
+
+        self.audiences.set_tags("carol", ["infra"])
+        Executor(self.notifier, [InfraRoutine]).run()
+
+        self.assertEqual([3], self.recipients())
+
+    def test_audience_without_followers(self):
+        with self.assertLogs(level="WARNING"):
+            self.notifier.send("Message", audience=["unknown"])
+
+        self.assertEqual([], self.recipients())
+
+    def test_digest_groups_resolved_recipients(self):
+        self.audiences.set_tags("alice", ["db", "infra"])
+        digest = DigestNotifier(self.notifier)
+
+        Executor(digest, [DatabaseRoutine, InfraRoutine]).run()
+
+        self.api.send_direct_message.assert_called_once_with(
+            user_id=1,
+            text="DatabaseRoutine: Disk almost full\n"
+                 "InfraRoutine: Load average high")
+
+    def test_digest_one_message_per_follower(self):
+        self.audiences.set_tags("bob", ["db", "infra"])
+        digest = DigestNotifier(self.notifier)
+
+        digest.send("Db: disk", audience=("db",))
+        digest.send("Infra: load", audience=("infra",))
+        digest.send("All: broadcast")
+        digest.flush()
+
+        sent = {}
+        for c in self.api.send_direct_message.call_args_list:
+            sent.setdefault(c[1]["user_id"], []).append(c[1]["text"])
+
+        self.assertEqual({
+            1: ["Db: disk\nAll: broadcast"],
+            2: ["Db: disk\nInfra: load\nAll: broadcast"],
+            3: ["All: broadcast"],
+        }, sent)
+
+    def test_dedup_summary_keeps_audience(self):
+        clock = FakeClock()
+        e = Executor(self.notifier, [DatabaseRoutine],
+                     deduplicator=Deduplicator(window_seconds=60, clock=clock))
+
+        e.run()
+        e.run()
+        clock.now += 60
+        e._flush_deduplicator()
+
+        self.assertEqual([1, 1], self.recipients())
+        self.assertIn("repeated 1 times",
+                      self.api.send_direct_message.call_args[1]["text"])
+
+    def test_digest_keeps_audience(self):
+        notifier = Mock(spec=["send"])
+        digest = DigestNotifier(notifier)
+
+        Executor(digest, [DatabaseRoutine]).run()
+
+        notifier.send.assert_called_once_with(
+            "DatabaseRoutine: Disk almost full", None, audience=("db",))
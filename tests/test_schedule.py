@@ -0,0 +1,129 @@
+# -*- coding: UTF-8 -*-
+
+from twitter_monitor.schedule import IntervalSchedule, CronSchedule
+from tests.test_core import RoutineTest
+from mock import Mock
+import datetime
+import unittest
+
+
+def timestamp(*args):
+    return datetime.datetime(*args).timestamp()
+
+
+class IntervalScheduleTestCase(unittest.TestCase):
+
+    def test_next_due(self):
+        schedule = IntervalSchedule(600)
+
+        self.assertIsNone(schedule.next_due(None, 1000))
+        self.assertEqual(1600, schedule.next_due(1000, 1000))
+
+    def test_next_due_with_phase(self):
+        schedule = IntervalSchedule(600, phase=100)
+
+        # First execution waits for the slot
+        self.assertEqual(1300, schedule.next_due(None, 1000))
+        self.assertEqual(1300, schedule.next_due(None, 1300))
+        self.assertEqual(1300, schedule.next_due(990, 990))
+        self.assertEqual(1900, schedule.next_due(1300, 1300))
+
+        # Late executions don't shift the phase
+        self.assertEqual(1900, schedule.next_due(1350, 1350))
+
+    def test_invalid_interval(self):
+        self.assertRaises(ValueError, IntervalSchedule, -1)
+        self.assertRaises(ValueError, IntervalSchedule, 0, phase=0)
+
+
+class CronScheduleTestCase(unittest.TestCase):
+
+    def test_every_five_minutes(self):
+        schedule = CronSchedule("*/5 * * * *")
+        last = timestamp(2014, 5, 13, 17, 52, 30)
+
+        self.assertEqual(timestamp(2014, 5, 13, 17, 55),
+                         schedule.next_due(last, last))
+
+    def test_never_executed(self):
+        schedule = CronSchedule("30 * * * *")
+
+        self.assertEqual(
+            timestamp(2014, 5, 13, 17, 30),
+            schedule.next_due(None, timestamp(2014, 5, 13, 17, 30, 40)))
+        self.assertEqual(
+            timestamp(2014, 5, 13, 18, 30),
+            schedule.next_due(None, timestamp(2014, 5, 13, 17, 31)))
+
+    def test_day_fields(self):
+        # 9h on weekdays
+        schedule = CronSchedule("0 9 * * 1-5")
+        friday = timestamp(2014, 5, 16, 10, 0)
+        self.assertEqual(timestamp(2014, 5, 19, 9, 0),
+                         schedule.next_due(friday, friday))
+
+        # Day of month or sunday
+        schedule = CronSchedule("0 0 1 * 0")
+        self.assertEqual(timestamp(2014, 5, 18, 0, 0),
+                         schedule.next_due(friday, friday))
+
+    def test_month_and_year_change(self):
+        schedule = CronSchedule("0 0 29 2 *")
+        last = timestamp(2014, 5, 13, 0, 0)
+
+        self.assertEqual(timestamp(2016, 2, 29, 0, 0),
+                         schedule.next_due(last, last))
+
+    def test_invalid_expressions(self):
+        for expression in ("* * * *", "60 * * * *", "*/0 * * * *",
+                           "5-1 * * * *", "a * * * *", "0 0 31 2 *"):
+            schedule = None
+            try:
+                schedule = CronSchedule(expression)
+                schedule.next_due(0, 0)
+            except ValueError:
+                continue
+
+            self.fail("Expression accepted: " + expression)
+
+
+class RoutineScheduleTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.routine = RoutineTest(Mock(name="Notifier"), {})
+
+    def test_without_schedule(self):
+        self.assertIsNone(self.routine.schedule)
+
+    def test_interval_seconds(self):
+        self.routine.interval_minutes = 10
+        self.routine.interval_seconds = 30
+
+        self.assertEqual(30, self.routine.schedule.seconds)
+
+        self.routine.run()
+        self.assertTrue(self.routine._skip_execution())
+
+    def test_spread_phase(self):
+        self.routine.interval_minutes = 10
+        self.routine.spread_phase = True
+
+        phase = self.routine.schedule.phase
+        self.assertTrue(0 <= phase < 600)
+        self.assertEqual(int(self.routine.uid[:8], 16) % 600, phase)
+
+        # Routines that never ran wait for their slot too
+        self.assertIsNotNone(self.routine.next_execution)
+
+    def test_spread_phase_without_interval(self):
+        self.routine.interval_minutes = 0
+        self.routine.spread_phase = True
+
+        self.assertRaises(ValueError, lambda: self.routine.schedule)
+
+    def test_cron(self):
+        self.routine.cron = "0 0 1 1 *"
+        self.routine.interval_minutes = 10
+
+        self.assertIsInstance(self.routine.schedule, CronSchedule)
+        self.assertTrue(self.routine._skip_execution())
@@ -0,0 +1,79 @@
+# -*- coding: UTF-8 -*-
+
+from twitter_monitor.state import StateCache, parse_timestamp, \
+    format_timestamp
+from twitter_monitor.store import MemoryStore
+from mock import Mock
+import unittest
+
+
+class TimestampTestCase(unittest.TestCase):
+
+    def test_format_and_parse(self):
+        timestamp = 1400000000.5
+        self.assertEqual(timestamp, parse_timestamp(format_timestamp(timestamp)))
+
+    def test_parse_without_microseconds(self):
+        self.assertIsNotNone(parse_timestamp("2014-05-13 17:53:20"))
+
+    def test_parse_invalid(self):
+        self.assertIsNone(parse_timestamp(""))
+        self.assertIsNone(parse_timestamp(None))
+        self.assertIsNone(parse_timestamp("invalid"))
+
+
+class StateCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.store = MemoryStore()
+        self.store.set_many({"a": "1", "b": "2"})
+        self.store.get_many = Mock(wraps=self.store.get_many)
+        self.store.set_many = Mock(wraps=self.store.set_many)
+
+        self.cache = StateCache(self.store)
+
+    def test_prefetch(self):
+        self.cache.prefetch(["a", "b", "c"])
+
+        self.assertEqual("1", self.cache["a"])
+        self.assertEqual("2", self.cache.get("b"))
+        self.assertIsNone(self.cache.get("c"))
+        self.store.get_many.assert_called_once_with(["a", "b", "c"])
+
+    def test_write_behind(self):
+        self.cache["a"] = "10"
+        self.cache["c"] = "30"
+
+        self.assertEqual("1", self.store["a"])
+        self.assertEqual("10", self.cache["a"])
+
+        self.cache.flush()
+        self.cache.flush()
+
+        self.store.set_many.assert_called_once_with({"a": "10", "c": "30"})
+        self.assertEqual("30", self.store["c"])
+
+    def test_failed_flush_keeps_changes(self):
+        self.cache["a"] = "10"
+        self.store.set_many.side_effect = [Exception("Error"), None]
+
+        self.assertRaises(Exception, self.cache.flush)
+        self.cache.flush()
+
+        self.assertEqual(2, self.store.set_many.call_count)
+
+    def test_timestamp(self):
+        self.assertIsNone(self.cache.get_timestamp("t"))
+
+        self.cache.set_timestamp("t", 1400000000.25)
+
+        self.assertEqual(1400000000.25, self.cache.get_timestamp("t"))
+        self.cache.flush()
+        self.assertEqual(
+            1400000000.25, parse_timestamp(self.store["t"]))
+
+    def test_delete(self):
+        del self.cache["a"]
+
+        self.assertNotIn("a", self.cache)
+        self.assertNotIn("a", self.store)
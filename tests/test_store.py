@@ -0,0 +1,85 @@
+# -*- coding: UTF-8 -*-
+
+from twitter_monitor.store import MemoryStore, DbmStore, SQLiteStore, \
+    SynchronizedStore, open_store
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class StoreTestMixin:
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "store")
+        self.store = self.create_store()
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.dir)
+
+    def test_get_set(self):
+        self.assertIsNone(self.store.get("key"))
+
+        self.store["key"] = "válue"
+
+        self.assertIn("key", self.store)
+        self.assertEqual("válue", self.store["key"])
+        self.assertEqual("válue", self.store.get("key"))
+
+    def test_delete(self):
+        self.store["key"] = "value"
+        del self.store["key"]
+
+        self.assertNotIn("key", self.store)
+        self.assertRaises(KeyError, self.store.__getitem__, "key")
+
+    def test_bulk(self):
+        items = {"key{}".format(i): str(i) for i in range(1200)}
+        self.store.set_many(items)
+
+        self.assertEqual(1200, len(self.store))
+        self.assertEqual(
+            {"key1": "1", "key1199": "1199"},
+            self.store.get_many(["key1", "key1199", "missing"]))
+
+
+class MemoryStoreTestCase(StoreTestMixin, unittest.TestCase):
+
+    def create_store(self):
+        return MemoryStore()
+
+
+class DbmStoreTestCase(StoreTestMixin, unittest.TestCase):
+
+    def create_store(self):
+        return DbmStore(self.path)
+
+
+class SQLiteStoreTestCase(StoreTestMixin, unittest.TestCase):
+
+    def create_store(self):
+        return SQLiteStore(self.path)
+
+    def test_values_survive_reopen(self):
+        self.store.set_many({"key": "value"})
+        self.store.close()
+
+        self.store = SQLiteStore(self.path)
+        self.assertEqual("value", self.store["key"])
+
+
+class SynchronizedStoreTestCase(StoreTestMixin, unittest.TestCase):
+
+    def create_store(self):
+        return SynchronizedStore({})
+
+
+class OpenStoreTestCase(unittest.TestCase):
+
+    def test_open_store(self):
+        self.assertIsInstance(open_store("memory"), MemoryStore)
+
+    def test_unknown_backend(self):
+        self.assertRaises(ValueError, open_store, "unknown")
@@ -0,0 +1,201 @@
+# -*- coding: UTF-8 -*-
+
+from abc import abstractmethod
+from . import core
+import asyncio
+import functools
+import time
+
+
+class AsyncExecutor(core.Executor):
+    """
+    Executor running routines concurrently on an asyncio event loop.
+    Subclasses of :class:`twitter_monitor.aio.AsyncRoutine` run as
+    coroutines, while plain :class:`twitter_monitor.core.Routine`
+    subclasses run in the loop's thread executor.
+
+    :param notifier: An instance of :class:`twitter_monitor.core.Notifier`
+    :param routines: A list of :class:`twitter_monitor.core.Routine`
+        subclasses (**not instances**)
+    :param key_value_store: A dictionary like storage.
+        It is used to store info about last
+        executions (like last execution time).
+    :param max_concurrency: Maximum number of routines running at
+        the same time.
+
+    Other keyword arguments (``leases``, ``metrics``, ``profiler``...) are
+    the same of :class:`twitter_monitor.core.Executor`.
+    """
+
+    def __init__(self, notifier, routines, key_value_store={},
+                 max_concurrency=100, **kwargs):
+        super().__init__(notifier, routines, key_value_store,
+                         max_workers=max_concurrency, **kwargs)
+
+    def _run_graph(self, routines):
+        return asyncio.run(self.run_routines_async(routines))
+
+    async def run_async(self):
+        """
+        Coroutine version of :meth:`run`, to be used from a running
+        event loop.
+        """
+
+        started_at = time.time()
+
+        try:
+            routines = self.routines_instances()
+            self.state.prefetch(self._state_keys(routines))
+
+            if self.leases is not None:
+                routines = [rt for rt in routines if self._acquire_lease(rt)]
+
+            success = all(await self.run_routines_async(routines))
+            self._flush_deduplicator()
+            self.state.flush()
+
+            if self.profiler is not None:
+                self.profiler.report()
+        except Exception as e:
+            if callable(getattr(self.key_value_store, "close", None)):
+                self.key_value_store.close()
+
+            self.logger.error("Error: " + str(e))
+            success = False
+
+        # Notifiers send messages synchronously
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._flush_notifier)
+
+        self.logger.debug("Cycle finished in {:.1f} ms".format(
+            (time.time() - started_at) * 1000))
+
+        return success
+
+    async def run_routines_async(self, routines):
+        """
+        Run the given routines concurrently, each one as soon as the
+        routines it depends on finish, returning a list with their
+        success flags. Routines blocked by a failed dependency are
+        left out.
+        """
+
+        semaphore = asyncio.Semaphore(self.max_workers or 1)
+        tasks = {}
+
+        async def run_routine(rt):
+            dependencies = [tasks[d] for d in rt.depends_on if d in tasks]
+            if dependencies:
+                await asyncio.wait(dependencies)
+
+            if self._blocked(rt):
+                return None
+
+            async with semaphore:
+                return await self._run_routine_async(rt)
+
+        # Tasks only start once all of them are created, so dependencies
+        # listed after their dependents are found as well.
+        for rt in routines:
+            tasks[type(rt)] = asyncio.ensure_future(run_routine(rt))
+
+        results = await asyncio.gather(*tasks.values())
+
+        return [success for success in results if success is not None]
+
+    async def _run_routine_async(self, rt):
+        if not isinstance(rt, AsyncRoutine):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self._run_routine, rt)
+
+        self.logger.info("Running \"{}\"".format(str(rt)))
+        started_at = time.perf_counter()
+        rt.last_status = None
+
+        try:
+            success = await asyncio.wait_for(rt.run(), rt.timeout_seconds)
+        except asyncio.TimeoutError:
+            self._routine_timed_out(rt)
+            await self._notify_timeout_async(rt)
+            success = False
+        except Exception as e:
+            self.logger.error(
+                "Exception on running routine \"{}\": {}".format(str(rt), e))
+            success = False
+
+        return self._routine_finished(rt, success, started_at)
+
+    async def _notify_timeout_async(self, rt):
+        try:
+            await rt.notify_async(self._timeout_message(rt))
+        except Exception as e:
+            self.logger.error(
+                "Error notifying timeout of \"{}\": {}".format(str(rt), e))
+
+
+class AsyncRoutine(core.Routine):
+    """
+    Routine representation whose :meth:`_execute` is a coroutine.
+    Use it with :class:`twitter_monitor.aio.AsyncExecutor`.
+
+    :param notifier: An instance of :class:`twitter_monitor.core.Notifier`
+    :param key_value_store: A dictionary like storage.
+        It is used to store info about last
+        executions (like last execution time).
+    """
+
+    async def run(self):
+        """
+        Run this routine
+        """
+
+        if self._skip_execution():
+            self.logger.info("Skipping execution")
+            self.last_status = "skipped"
+            return True
+
+        self._begin_run()
+
+        try:
+            if await self._execute():
+                return self._succeeded()
+
+            self._failed()
+            return False
+        finally:
+            self._end_run()
+
+    @abstractmethod
+    async def _execute(self):
+        """
+        Put your code here in your subclasses.
+        Must be implemented by subclasses.
+
+        Use await self.notify_async('Some message') to send a message
+        to recepients.
+        """
+
+        return NotImplemented
+
+    async def notify_async(self, message):
+        """
+        Send the message without blocking the event loop. Notifier's
+        ``send_async`` coroutine is used when available, otherwise
+        ``send`` runs in the loop's thread executor.
+        """
+
+        new_message = self._prepare_message(message)
+        if new_message is None:
+            return
+
+        options = self._send_options()
+
+        send_async = getattr(self.notifier, "send_async", None)
+        if asyncio.iscoroutinefunction(send_async):
+            await send_async(new_message, **options)
+            return
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            None, functools.partial(self.notifier.send, new_message,
+                                    **options))
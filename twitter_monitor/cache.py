@@ -0,0 +1,104 @@
+# -*- coding: UTF-8 -*-
+
+from . import common
+from concurrent.futures import Future
+import collections
+import threading
+import time
+
+
+class ProbeCache(common.loggable):
+    """
+    Memoizes probes (functions fetching data from a source) shared by
+    routines. Entries are keyed by probe name and arguments, expire
+    after a TTL and the least recently used ones are evicted when the
+    cache is full. Concurrent calls for the same key wait for a single
+    fetch.
+
+    :param max_entries: Max of entries kept.
+    :param ttl_seconds: Default seconds an entry is valid.
+    :param clock: Function returning current time in seconds.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=60, clock=time.time):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+
+        # Key => (expires, value)
+        self._entries = collections.OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get(self, name, fetch, *args, ttl=None, **kwargs):
+        """
+        Returns the cached result of ``fetch(*args, **kwargs)``, calling
+        it if there isn't a valid entry. Errors aren't cached.
+
+        :param name: Probe name (e.g. "status-page").
+        :param fetch: Function fetching the value.
+        :param ttl: Seconds the value is valid (default ``ttl_seconds``).
+        """
+
+        key = (name, args, tuple(sorted(kwargs.items())))
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None:
+                if entry[0] > self._clock():
+                    self._entries.move_to_end(key)
+                    return entry[1]
+
+                del self._entries[key]
+
+            future = self._inflight.get(key)
+            owner = future is None
+
+            if owner:
+                future = self._inflight[key] = Future()
+
+        if not owner:
+            self.logger.debug("Waiting probe \"{}\" in flight".format(name))
+            return future.result()
+
+        try:
+            value = fetch(*args, **kwargs)
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+
+            future.set_exception(e)
+            raise
+
+        ttl = self.ttl_seconds if ttl is None else ttl
+
+        with self._lock:
+            del self._inflight[key]
+
+            self._entries[key] = (self._clock() + ttl, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        future.set_result(value)
+
+        return value
+
+    def invalidate(self, name=None):
+        """
+        Remove entries of probe ``name`` (or all entries).
+        """
+
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+                return
+
+            for key in [k for k in self._entries if k[0] == name]:
+                del self._entries[key]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
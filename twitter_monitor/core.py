@@ -3,17 +3,56 @@
 from abc import ABCMeta
 from abc import abstractmethod
 from . import common
+from .followers import FollowerCache
+from .ratelimit import RateLimiter
+from .outbox import DurableQueue, Outbox
+from .store import MemoryStore, SynchronizedStore, open_store
+from .state import StateCache, parse_timestamp, format_timestamp
+from .schedule import IntervalSchedule, CronSchedule
+from .cache import ProbeCache
+from .digest import DigestNotifier
+from .dedup import Deduplicator
+from .routing import AudienceIndex
+from .pipeline import DeliveryPipeline
+from .history import History
+import collections
 import datetime
 import hashlib
+import heapq
+import itertools
+import json
 import logging
-import tweepy
-import dbm
+import multiprocessing
+import queue
+import time
+import os
+import random
 import tempfile
-import collections
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures import FIRST_COMPLETED, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
 
 # Module logger
 logger = logging.getLogger(__name__)
 
+# Marks a routine without checkpoint set in current run
+_NO_CHECKPOINT = object()
+
+# Seconds between checks for the start of a task queued in process pool
+_PROCESS_START_POLL_SECONDS = 0.05
+
+# Queue where worker processes report tasks they start (set in workers)
+_started_tasks = None
+
+
+class RoutineTimeout(Exception):
+    """
+    Raised when a routine run exceeds its
+    :attr:`Routine.timeout_seconds`.
+    """
+
 
 class ExecutorFactory(common.loggable):
     """
@@ -30,26 +69,96 @@ class ExecutorFactory(common.loggable):
         - access_token_key
         - access_token_secret
     :param setup_default_logger: If True (default) it'll setup the root logger.
+    :param queue_path: If informed, messages are queued in a SQLite
+        database in this path and delivered by a background worker
+        (see :class:`twitter_monitor.outbox.Outbox`).
+    :param store_backend: Key-value store backend (``memory``, ``dbm``
+        or ``sqlite``, see :mod:`twitter_monitor.store`).
+    :param store_path: Key-value store file path. Defaults to a file in
+        the temp directory.
+    :param metrics: A :class:`twitter_monitor.metrics.Registry` to record
+        executor and notifier metrics.
+    :param digest: If True, messages of a cycle are coalesced (see
+        :class:`twitter_monitor.digest.DigestNotifier`).
+    :param digest_max_hold_seconds: Max of seconds a message is held
+        in digest.
+    :param dedup_seconds: If informed, repeated messages of a routine
+        are suppressed for this many seconds (see
+        :class:`twitter_monitor.dedup.Deduplicator`).
+    :param audiences: A dictionary with follower screen names and their
+        audience tags (see :class:`twitter_monitor.routing.AudienceIndex`).
+    :param delivery_workers: If informed, messages are delivered by this
+        many threads, without blocking routines (see
+        :class:`twitter_monitor.pipeline.DeliveryPipeline`).
+    :param backpressure: Policy used when delivery queue is full:
+        "block" (default), "drop_oldest" or "spill" (to a file in the
+        temp directory).
+    :param history_path: If informed, routines execution history is kept
+        in this directory (see :class:`twitter_monitor.history.History`).
     """
 
     def __init__(self, routines,
-                 twitter_keys, setup_default_logger=True):
+                 twitter_keys, setup_default_logger=True, queue_path=None,
+                 store_backend="dbm", store_path=None, metrics=None,
+                 digest=False, digest_max_hold_seconds=None,
+                 dedup_seconds=None, audiences=None, delivery_workers=None,
+                 backpressure="block", history_path=None):
         self.routines = routines
         self.twitter_keys = twitter_keys
         self.setup_default_logger = setup_default_logger
+        self.queue_path = queue_path
+        self.store_backend = store_backend
+        self.store_path = store_path
+        self.metrics = metrics
+        self.digest = digest
+        self.digest_max_hold_seconds = digest_max_hold_seconds
+        self.dedup_seconds = dedup_seconds
+        self.audiences = audiences
+        self.delivery_workers = delivery_workers
+        self.backpressure = backpressure
+        self.history_path = history_path
 
     def create_default(self):
         """
         Create a default Executor and setup a default logger.
         """
 
+        started_at = time.time()
+
         self._setup_logger()
         self.logger.debug("Creating a default Executor")
 
-        notifier = self._create_notifier(self._create_twitter_api())
+        key_value_store = SynchronizedStore(self._create_key_value_store())
+
+        # Twitter api is only created when a message is really sent
+        notifier = LazyNotifier(lambda: self._create_notifier(
+            self._create_twitter_api(), key_value_store))
+
+        if self.queue_path is not None:
+            notifier = Outbox(notifier, DurableQueue(self.queue_path))
+            notifier.start()
+
+        if self.delivery_workers:
+            notifier = self._create_pipeline(notifier)
+
+        if self.digest:
+            notifier = DigestNotifier(
+                notifier, max_hold_seconds=self.digest_max_hold_seconds)
 
-        executor = Executor(
-            notifier, self.routines, self._create_key_value_store())
+        deduplicator = None
+        if self.dedup_seconds is not None:
+            deduplicator = Deduplicator(window_seconds=self.dedup_seconds)
+
+        history = None
+        if self.history_path is not None:
+            history = History(self.history_path)
+
+        executor = Executor(notifier, self.routines, key_value_store,
+                            metrics=self.metrics, deduplicator=deduplicator,
+                            history=history)
+
+        self.logger.debug("Executor created in {:.1f} ms".format(
+            (time.time() - started_at) * 1000))
 
         return executor
 
@@ -74,6 +183,10 @@ class ExecutorFactory(common.loggable):
     def _create_twitter_api(self):
         self.logger.debug("Creating a twitter api")
 
+        # Imported here, it takes a while and most executions don't
+        # send any message.
+        import tweepy
+
         ta = self.twitter_keys
 
         self.logger.debug("Consumer_key: " + ta["consumer_key"])
@@ -88,19 +201,46 @@ class ExecutorFactory(common.loggable):
 
         return tweepy.API(auth)
 
-    def _create_notifier(self, twitter_api):
-        n = Notifier(twitter_api)
+    def _create_notifier(self, twitter_api, key_value_store=None):
+        followers = FollowerCache(twitter_api, key_value_store,
+                                  metrics=self.metrics)
+
+        audiences = None
+        if self.audiences is not None:
+            audiences = AudienceIndex(self.audiences)
+
+        rate_limiter = RateLimiter(key_value_store=key_value_store)
+
+        n = Notifier(twitter_api, followers=followers,
+                     rate_limiter=rate_limiter, metrics=self.metrics,
+                     audiences=audiences)
         return n
 
+    def _create_pipeline(self, notifier):
+        spill = None
+        if self.backpressure == "spill":
+            spill = DurableQueue(os.path.join(
+                tempfile.gettempdir(), ".twitter-monitor-spill"))
+
+        pipeline = DeliveryPipeline(
+            notifier, workers=self.delivery_workers,
+            policy=self.backpressure, spill=spill)
+        pipeline.start()
+
+        return pipeline
+
     def _create_key_value_store(self):
+        path = self.store_path
+        if path is None:
+            path = os.path.join(tempfile.gettempdir(), ".twitter-monitor-info")
+
         try:
-            name = ".twitter-monitor-info"
-            filename = "{}/{}".format(tempfile.gettempdir(), name)
-            return dbm.open(filename, "c")
+            return open_store(self.store_backend, path)
         except Exception as e:
-            pass
+            self.logger.error(
+                "Error opening key-value store, using memory: " + str(e))
 
-        return None
+        return MemoryStore()
 
 
 class Executor(common.loggable):
@@ -116,41 +256,666 @@ class Executor(common.loggable):
         It is used to store info about last
         executions (like last execution time).
         It is usual to use a simple key store like *anydbm*.
+    :param max_workers: Number of threads used to run routines concurrently.
+        If None (default) or 1, routines are executed one after another.
+    :param processes: Number of worker processes used to run routines
+        marked with :attr:`Routine.run_in_process`. If None (default),
+        these routines run like the others.
+    :param leases: A lease manager (like
+        :class:`twitter_monitor.lease.SQLiteLeaseManager`) shared with
+        other nodes. If informed, a routine only runs on the node holding
+        its lease.
+    :param metrics: A :class:`twitter_monitor.metrics.Registry` to record
+        routines duration and runs. If None (default), nothing is recorded.
+    :param profiler: A :class:`twitter_monitor.profiling.Profiler` to
+        profile routines and report the slow ones. If None (default),
+        routines aren't profiled.
+    :param probe_cache: A :class:`twitter_monitor.cache.ProbeCache`
+        shared by routines (see :meth:`Routine.probe`). If None, a default
+        cache is created.
+    :param deduplicator: A :class:`twitter_monitor.dedup.Deduplicator`
+        suppressing repeated messages of routines. If it hasn't a store,
+        its index is persisted with routines state. If None (default),
+        all messages are sent.
+    :param history: A :class:`twitter_monitor.history.History` where the
+        outcome of each run (skipped ones aside) is recorded. If None
+        (default), nothing is recorded.
+
+    Routines state is kept in a :class:`twitter_monitor.state.StateCache`,
+    loaded in bulk when a cycle starts and written back when it finishes.
     """
 
-    def __init__(self, notifier, routines, key_value_store={}):
+    def __init__(self, notifier, routines, key_value_store={},
+                 max_workers=None, processes=None, leases=None,
+                 metrics=None, profiler=None, probe_cache=None,
+                 deduplicator=None, history=None):
         self.notifier = notifier
         self.routines = routines
+        self.max_workers = max_workers
+        self.processes = processes
+        self.leases = leases
+        self.metrics = metrics
+        self.profiler = profiler
+        self.probe_cache = ProbeCache() if probe_cache is None \
+            else probe_cache
+        self.deduplicator = deduplicator
+        self.history = history
+        if metrics is not None:
+            self._durations = metrics.histogram(
+                "twitter_monitor_routine_duration_seconds",
+                "Duration of routines runs", ["routine"])
+            self._runs = metrics.counter(
+                "twitter_monitor_routine_runs_total",
+                "Routines runs by status", ["routine", "status"])
+        self._process_pool = None
+        self._process_pool_lock = threading.Lock()
+        self._process_task_ids = itertools.count()
+        self._process_starts = {}  # Task id => start time
+        self._process_starts_queue = None
         self.key_value_store = key_value_store
+        self.state = StateCache(key_value_store)
         self._routines_instances = None
 
+        if deduplicator is not None and deduplicator.store is None:
+            deduplicator.store = self.state
+        self._stop_event = threading.Event()
+
     def run(self):
         """
         Execute all routines. It returns True if all routines are
         executed with success.
         """
 
-        success = True
+        started_at = time.time()
 
         try:
-            for rt in self.routines_instances():
-                self.logger.info("Running \"{}\"".format(str(rt)))
-
-                if not rt.run():
-                    self.logger.error(
-                        "Error on running routine \"{}\"".format(str(rt)))
+            routines = self.routines_instances()
+            self.state.prefetch(self._state_keys(routines))
 
-                    success = False
+            success = all(self._run_routines(routines))
+            self._flush_deduplicator()
+            self.state.flush()
 
-                self.logger.info("Finished \"{}\"".format(str(rt)))
+            if self.profiler is not None:
+                self.profiler.report()
         except Exception as e:
-            if (hasattr(self.key_value_store, "close")
-                    and isinstance(getattr(self.key_value_store, "close"), collections.Callable)):
-                    self.key_value_store.close()
+            if callable(getattr(self.key_value_store, "close", None)):
+                self.key_value_store.close()
 
             self.logger.error("Error: " + str(e))
             success = False
 
+        self._flush_notifier()
+
+        self.logger.debug("Cycle finished in {:.1f} ms".format(
+            (time.time() - started_at) * 1000))
+
+        return success
+
+    def _flush_deduplicator(self):
+        """
+        Send summaries of suppressed messages whose window ended and
+        save the deduplicator index.
+        """
+
+        if self.deduplicator is None:
+            return
+
+        try:
+            routines = {rt.uid: rt for rt in self.routines_instances()}
+
+            for uid, summary in self.deduplicator.expired():
+                rt = routines.get(uid)
+                options = {} if rt is None else rt._send_options()
+                self.notifier.send(summary, **options)
+
+            self.deduplicator.save()
+        except Exception as e:
+            self.logger.error("Error flushing deduplicator: " + str(e))
+
+    def _flush_notifier(self, wait=True):
+        """
+        Deliver messages buffered by the notifier (if it buffers).
+
+        :param wait: If False, notifiers delivering in background aren't
+            waited for (see
+            :meth:`twitter_monitor.pipeline.DeliveryPipeline.flush`).
+        """
+
+        try:
+            if not callable(getattr(self.notifier, "flush", None)):
+                return
+
+            if wait:
+                self.notifier.flush()
+            else:
+                self.notifier.flush(wait=False)
+        except Exception as e:
+            self.logger.error("Error flushing notifier: " + str(e))
+
+    def run_forever(self, retry_minutes=1):
+        """
+        Keep running routines until :meth:`stop` is called. Routines are
+        kept in a priority queue ordered by their next execution time and
+        the executor sleeps until the earliest one is due, so each tick
+        only touches the routines that must run.
+
+        :param retry_minutes: Minutes to wait before running again a
+            routine without schedule or a routine that failed.
+        """
+
+        self.logger.info("Starting scheduler")
+        self._stop_event.clear()
+
+        routines = self.routines_instances()
+        self.state.prefetch(self._state_keys(routines))
+
+        now = time.time()
+        queue = [(self._next_due(rt, now, now), index, rt)
+                 for index, rt in enumerate(routines)]
+        heapq.heapify(queue)
+
+        try:
+            while queue and not self._stop_event.is_set():
+                now = time.time()
+
+                if queue[0][0] > now:
+                    self._stop_event.wait(queue[0][0] - now)
+                    continue
+
+                due = []
+                while queue and queue[0][0] <= now:
+                    due.append(heapq.heappop(queue))
+
+                self._run_routines([rt for _, _, rt in due])
+
+                now = time.time()
+                retry = now + retry_minutes * 60
+                for _, index, rt in due:
+                    heapq.heappush(
+                        queue, (self._next_due(rt, now, retry), index, rt))
+
+                self._flush_deduplicator()
+                self._flush_state(force=False)
+                self._flush_notifier(wait=False)
+
+                if self.profiler is not None:
+                    self.profiler.report()
+        finally:
+            self._flush_state(force=True)
+            self._flush_notifier()
+            self.close()
+
+        self.logger.info("Scheduler stopped")
+
+    def stop(self):
+        """
+        Stop a running :meth:`run_forever` loop.
+        """
+
+        self._stop_event.set()
+
+    def close(self):
+        """
+        Shutdown worker processes and stop notifier background workers
+        (if any), delivering queued messages.
+        """
+
+        with self._process_pool_lock:
+            pool, self._process_pool = self._process_pool, None
+
+        if pool is not None:
+            pool.shutdown()
+
+        try:
+            if callable(getattr(self.notifier, "stop", None)):
+                self.notifier.stop()
+        except Exception as e:
+            self.logger.error("Error stopping notifier: " + str(e))
+
+    def _recycle_process_pool(self, pool):
+        """
+        Terminate worker processes of ``pool`` (e.g. one is stuck in a
+        routine that timed out). A new pool is created for the next
+        routine. Nothing is done if the pool was already replaced.
+        """
+
+        with self._process_pool_lock:
+            if pool is None or pool is not self._process_pool:
+                return
+
+            self._process_pool = None
+
+        self.logger.warning("Terminating worker processes")
+
+        # ProcessPoolExecutor doesn't expose its processes before
+        # Python 3.14 (terminate_workers)
+        terminate = getattr(pool, "terminate_workers", None)
+        if callable(terminate):
+            terminate()
+            return
+
+        for process in list((getattr(pool, "_processes", None) or {})
+                            .values()):
+            process.terminate()
+
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _next_due(self, rt, now, retry):
+        """
+        Returns when a routine must run: its next execution time or
+        ``retry`` if it is already due (plus routine jitter).
+        """
+
+        next_execution = rt._next_execution_time()
+        if next_execution is None or next_execution <= now:
+            next_execution = retry
+
+        if rt.jitter_seconds:
+            next_execution += random.uniform(0, rt.jitter_seconds)
+
+        return next_execution
+
+    def _state_keys(self, routines):
+        return [key for rt in routines for key in rt._state_keys()]
+
+    def _flush_state(self, force):
+        try:
+            if force:
+                self.state.flush()
+            else:
+                self.state.flush_if_due()
+        except Exception as e:
+            self.logger.error("Error saving routines state: " + str(e))
+
+    def _run_routines(self, routines):
+        """
+        Run the given routines, returning a list with their success flags.
+        Routines leased by other nodes or blocked by a failed dependency
+        are left out.
+        """
+
+        if self.leases is not None:
+            routines = [rt for rt in routines if self._acquire_lease(rt)]
+
+        return self._run_graph(routines)
+
+    def _run_graph(self, routines):
+        """
+        Run routines following their dependencies: each routine starts as
+        soon as the routines it depends on finish (concurrently if
+        configured), so independent branches don't wait for each other.
+        Routines whose dependencies failed are left out.
+        """
+
+        classes = {type(rt) for rt in routines}
+
+        # Routine => dependencies (in this run) not finished yet
+        waiting = {rt: {d for d in rt.depends_on if d in classes}
+                   for rt in routines}
+
+        # Routine class => routines depending on it
+        dependents = {}
+        for rt, dependencies in waiting.items():
+            for dependency in dependencies:
+                dependents.setdefault(dependency, []).append(rt)
+
+        ready = collections.deque()
+        running = {}
+        results = []
+
+        def finish(rt):
+            """
+            Returns the routines that were only waiting for ``rt``.
+            """
+
+            released = []
+            for other in dependents.get(type(rt), ()):
+                waiting[other].discard(type(rt))
+                if not waiting[other]:
+                    released.append(other)
+
+            return released
+
+        def schedule(routines):
+            """
+            Queue routines whose dependencies finished. Routines running
+            in worker processes are submitted right away, so they run
+            meanwhile. Blocked routines are finished at once.
+            """
+
+            routines = collections.deque(routines)
+            while routines:
+                rt = routines.popleft()
+
+                if self._blocked(rt):
+                    routines.extend(finish(rt))
+                else:
+                    ready.append((rt, self._submit_to_process(rt)))
+
+        schedule(rt for rt, dependencies in waiting.items()
+                 if not dependencies)
+
+        pool = None
+        if self._is_concurrent() and len(routines) > 1:
+            pool = ThreadPoolExecutor(self.max_workers)
+
+        try:
+            while ready or running:
+                while ready:
+                    rt, task = ready.popleft()
+
+                    if pool is None:
+                        results.append(self._run_routine(rt, task))
+                        schedule(finish(rt))
+                    else:
+                        running[pool.submit(
+                            self._run_routine, rt, task)] = rt
+
+                if running:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+                    for future in done:
+                        results.append(future.result())
+                        schedule(finish(running.pop(future)))
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        return results
+
+    def _blocked(self, rt):
+        """
+        Returns True (and marks the routine as blocked) if a dependency
+        of the routine failed.
+        """
+
+        for dependency in rt.depends_on:
+            status = self._instances_by_class[dependency].last_status
+
+            if status in ("failure", "timeout", "blocked"):
+                rt.last_status = "blocked"
+                self.logger.info(
+                    "Skipping \"{}\", dependency \"{}\" failed".format(
+                        str(rt), dependency.__name__))
+
+                if self.metrics is not None:
+                    self._runs.inc(routine=rt.name, status=rt.last_status)
+
+                return True
+
+        return False
+
+    def _is_concurrent(self):
+        return self.max_workers is not None and self.max_workers > 1
+
+    def _run_routine(self, rt, task=None):
+        """
+        Run a single routine, returning its success flag. Exceptions
+        are logged and reported as a failure, so one broken routine
+        doesn't stop the others.
+        """
+
+        self.logger.info("Running \"{}\"".format(str(rt)))
+        started_at = time.perf_counter()
+        rt.last_status = None
+
+        try:
+            if task is not None:
+                success = self._process_result(rt, task)
+            elif rt.timeout_seconds is not None:
+                success = self._call_with_timeout(
+                    lambda: self._call_routine(rt), rt.timeout_seconds,
+                    rt.abandon)
+            else:
+                success = self._call_routine(rt)
+        except RoutineTimeout:
+            self._routine_timed_out(rt)
+            self._notify_timeout(rt)
+            success = False
+        except Exception as e:
+            self.logger.error(
+                "Exception on running routine \"{}\": {}".format(str(rt), e))
+            success = False
+
+        return self._routine_finished(rt, success, started_at)
+
+    def _call_routine(self, rt):
+        if self.profiler is not None:
+            return self.profiler.run(rt)
+
+        return rt.run()
+
+    def _call_with_timeout(self, func, timeout, on_timeout=None):
+        """
+        Call ``func`` in a separate thread, raising
+        :class:`RoutineTimeout` if it doesn't finish in ``timeout``
+        seconds. A thread can't be killed, so a routine that timed out
+        keeps running in background but is no longer waited
+        (``on_timeout`` is called to abandon it).
+        """
+
+        result = {}
+
+        def target():
+            try:
+                result["value"] = func()
+            except BaseException as e:
+                result["error"] = e
+
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        thread.join(timeout)
+
+        if thread.is_alive():
+            if on_timeout is not None:
+                on_timeout()
+
+            raise RoutineTimeout()
+
+        if "error" in result:
+            raise result["error"]
+
+        return result["value"]
+
+    def _routine_timed_out(self, rt):
+        rt.last_status = "timeout"
+        self.logger.error("Routine \"{}\" timed out after {}s".format(
+            str(rt), rt.timeout_seconds))
+
+    def _timeout_message(self, rt):
+        return "Timeout after {} seconds".format(rt.timeout_seconds)
+
+    def _notify_timeout(self, rt):
+        try:
+            rt.notify(self._timeout_message(rt))
+        except Exception as e:
+            self.logger.error(
+                "Error notifying timeout of \"{}\": {}".format(str(rt), e))
+
+    def _routine_finished(self, rt, success, started_at):
+        """
+        Log and record metrics of a finished routine.
+        """
+
+        if not success:
+            if rt.last_status != "timeout":
+                rt.last_status = "failure"
+
+            self.logger.error(
+                "Error on running routine \"{}\"".format(str(rt)))
+
+        self.logger.info("Finished \"{}\"".format(str(rt)))
+
+        duration = time.perf_counter() - started_at
+
+        if self.metrics is not None:
+            self._durations.observe(duration, routine=rt.name)
+            self._runs.inc(routine=rt.name, status=rt.last_status)
+
+        if self.profiler is not None and rt.last_status != "skipped":
+            self.profiler.record(rt, duration)
+
+        if self.history is not None and rt.last_status != "skipped":
+            self._record_history(rt, duration)
+
+        return success
+
+    def _record_history(self, rt, duration):
+        try:
+            self.history.record(rt.uid, time.time() - duration, duration,
+                                rt.last_status or "success")
+        except Exception as e:
+            self.logger.error(
+                "Error recording history of \"{}\": {}".format(str(rt), e))
+
+    def _acquire_lease(self, rt):
+        """
+        Acquire the lease of a routine (it lasts one interval). Returns
+        False if the routine is leased by another node.
+        """
+
+        if rt._skip_execution():
+            return True
+
+        schedule = rt.schedule
+        ttl = getattr(schedule, "seconds", 60)
+
+        try:
+            rt.lease_token = self.leases.acquire(rt.uid, ttl)
+        except Exception as e:
+            self.logger.error(
+                "Error acquiring lease of \"{}\": {}".format(str(rt), e))
+            return False
+
+        if rt.lease_token is None:
+            self.logger.info(
+                "Routine \"{}\" leased by another node".format(str(rt)))
+            return False
+
+        return True
+
+    def _submit_to_process(self, rt):
+        """
+        Submit a routine to a worker process, returning a
+        :class:`_ProcessTask` or None if the routine must run in this
+        process.
+        """
+
+        if not self.processes or not rt.run_in_process \
+                or rt._skip_execution():
+            return None
+
+        state = self.state.get_many(rt._state_keys())
+
+        # Pool is created and replaced by several threads
+        with self._process_pool_lock:
+            if self._process_pool is None:
+                # Each pool gets its own queue, since terminating workers
+                # may break it.
+                self._process_starts_queue = multiprocessing.Queue()
+                self._process_pool = ProcessPoolExecutor(
+                    self.processes, initializer=_init_process,
+                    initargs=(self._process_starts_queue,))
+
+            pool = self._process_pool
+            id = next(self._process_task_ids)
+
+            return _ProcessTask(
+                id, pool, self._process_starts_queue,
+                pool.submit(_run_in_process, type(rt), state, id))
+
+    def _process_output(self, rt, task):
+        """
+        Wait for the output of a routine running in a worker process.
+        Its timeout counts from the moment a worker starts it, so the
+        time waiting for a free worker doesn't count.
+        """
+
+        if rt.timeout_seconds is None:
+            return task.future.result()
+
+        try:
+            while True:
+                started_at = self._process_started_at(task)
+
+                if started_at is not None:
+                    return task.future.result(max(
+                        0, started_at + rt.timeout_seconds - time.time()))
+
+                try:
+                    return task.future.result(_PROCESS_START_POLL_SECONDS)
+                except FutureTimeoutError:
+                    continue
+        finally:
+            with self._process_pool_lock:
+                self._process_starts.pop(task.id, None)
+
+    def _process_started_at(self, task):
+        """
+        Returns when a worker process started the task or None if it is
+        still waiting in the pool.
+        """
+
+        with self._process_pool_lock:
+            while True:
+                try:
+                    id, started_at = task.starts_queue.get_nowait()
+                except (queue.Empty, OSError, ValueError):
+                    break
+
+                self._process_starts[id] = started_at
+
+            return self._process_starts.get(task.id)
+
+    def _process_result(self, rt, task):
+        """
+        Wait for a routine running in a worker process, sending its
+        messages and merging its state changes.
+        """
+
+        try:
+            success, messages, state = self._process_output(rt, task)
+        except FutureTimeoutError:
+            # A running task can't be cancelled, so the pool is replaced
+            # (its workers are terminated).
+            self._recycle_process_pool(task.pool)
+            raise RoutineTimeout()
+        except BrokenProcessPool:
+            # The pool was recycled (or a worker died) before this
+            # routine ran, so it's submitted again.
+            self.logger.warning(
+                "Worker process lost, submitting \"{}\" again".format(
+                    str(rt)))
+
+            task = self._submit_to_process(rt)
+
+            try:
+                success, messages, state = self._process_output(rt, task)
+            except FutureTimeoutError:
+                self._recycle_process_pool(task.pool)
+                raise RoutineTimeout()
+
+        if not rt._holds_lease():
+            rt.last_status = "failure"
+            return False
+
+        for args, kwargs in messages:
+            if self.deduplicator is not None:
+                message = self.deduplicator.check(rt.uid, args[0])
+                if message is None:
+                    continue
+
+                args = (message,) + args[1:]
+
+            self.notifier.send(*args, **kwargs)
+
+        for key, value in state.items():
+            if self.state.get(key) != value:
+                self.state[key] = value
+
+        rt.last_status = "success" if success else "failure"
+
         return success
 
     def routines_instances(self):
@@ -161,33 +926,122 @@ class Executor(common.loggable):
         if self._routines_instances is not None:
             return self._routines_instances
 
+        self._validate_dependencies()
+        self._instances_by_class = {}
         self._routines_instances = []
 
         for class_ref in self.routines:
-            self._routines_instances.append(
-                class_ref(self.notifier, self.key_value_store))
+            rt = class_ref(self.notifier, self.state)
+            rt.probe_cache = self.probe_cache
+            rt.leases = self.leases
+            rt.deduplicator = self.deduplicator
+
+            self._instances_by_class[class_ref] = rt
+            self._routines_instances.append(rt)
 
         return self._routines_instances
 
+    def _validate_dependencies(self):
+        """
+        Raises ValueError if a routine depends on a routine that isn't
+        in executor routines or if dependencies are cyclic.
+        """
+
+        validated = set()
+        visiting = set()
+
+        def validate(class_ref):
+            if class_ref in validated:
+                return
+
+            if class_ref in visiting:
+                raise ValueError(
+                    "Cyclic dependency on routine \"{}\"".format(
+                        class_ref.__name__))
+
+            visiting.add(class_ref)
+
+            for dependency in class_ref.depends_on:
+                if dependency not in self.routines:
+                    raise ValueError(
+                        "Routine \"{}\" depends on \"{}\", which isn't in "
+                        "executor routines".format(
+                            class_ref.__name__, dependency.__name__))
+
+                validate(dependency)
+
+            visiting.discard(class_ref)
+            validated.add(class_ref)
+
+        for class_ref in self.routines:
+            validate(class_ref)
+
 
 class Notifier(common.loggable):
     """
     It sends a message to destinations (followers) with twitter API.
 
     :param api: An API instance (for now, we are using Tweepy)
+    :param max_workers: Number of threads used to send direct messages
+        concurrently. If None (default) or 1, messages are sent one
+        after another.
+    :param followers: An instance of
+        :class:`twitter_monitor.followers.FollowerCache`. If None, an
+        in-memory cache is created.
+    :param rate_limiter: An instance of
+        :class:`twitter_monitor.ratelimit.RateLimiter` used to pace
+        direct messages. If None, messages are sent without pacing.
+    :param metrics: A :class:`twitter_monitor.metrics.Registry` to record
+        send latency and API calls. If None (default), nothing is recorded.
+    :param audiences: An instance of
+        :class:`twitter_monitor.routing.AudienceIndex` mapping followers
+        to audience tags. If None (default), messages with an audience
+        go to all followers.
     """
 
-    def __init__(self, api):
+    def __init__(self, api, max_workers=None, followers=None,
+                 rate_limiter=None, metrics=None, audiences=None):
         self._api = api
+        self.max_workers = max_workers
+        self.rate_limiter = rate_limiter
+        self.metrics = metrics
+
+        if metrics is not None:
+            self._send_durations = metrics.histogram(
+                "twitter_monitor_notifier_send_seconds",
+                "Duration of messages delivery to all recipients")
+            self._api_calls = metrics.counter(
+                "twitter_monitor_api_calls_total",
+                "Twitter API calls", ["method"])
+            self._api_errors = metrics.counter(
+                "twitter_monitor_api_errors_total",
+                "Twitter API calls with errors", ["method"])
 
         # Cache dos seguidores...
-        self._followers = None
+        if followers is None:
+            followers = FollowerCache(api, metrics=metrics)
+
+        self.followers = followers
+        self.audiences = audiences
 
-    def send(self, message):
+        if audiences is not None:
+            followers.add_listener(audiences.followers_changed)
+
+    def send(self, message, recipient_ids=None, urgent=False,
+             audience=None):
         """
-        Send a message to all destinations
+        Send a message to all destinations. A failure sending to one
+        follower doesn't stop sending to the others.
 
         :param message: A message to send to all followers.
+        :param recipient_ids: Restrict delivery to followers with these
+            ids. If None (default), the message goes to all followers.
+        :param urgent: Ignored, messages are always sent right away
+            (see :class:`twitter_monitor.digest.DigestNotifier`).
+        :param audience: Tags of followers that must receive the message
+            (see :attr:`Routine.audience`).
+        :returns: A list of ``(follower, exception)`` tuples with
+            failed deliveries.
         """
 
         if not isinstance(message, str):
@@ -198,19 +1052,148 @@ class Notifier(common.loggable):
         if len(message.strip()) == 0:
             # @todo - Change this to exception
             self.logger.warn("Empty message")
+            return []
+
+        started_at = time.perf_counter()
+
+        followers = list(self._get_followers())
+        recipient_ids = self.recipients(audience, recipient_ids)
+        if recipient_ids is not None:
+            recipient_ids = set(recipient_ids)
+            followers = [f for f in followers if f.id in recipient_ids]
+
+        messages = [message] * len(followers)
+
+        if (self.max_workers is not None and self.max_workers > 1
+                and len(followers) > 1):
+            with ThreadPoolExecutor(self.max_workers) as pool:
+                errors = list(pool.map(self._send_to, followers, messages))
+        else:
+            errors = list(map(self._send_to, followers, messages))
+
+        failures = [(follower, error)
+                    for follower, error in zip(followers, errors)
+                    if error is not None]
+
+        if failures:
+            self.logger.error(
+                "Message not delivered to {} of {} followers".format(
+                    len(failures), len(followers)))
+
+        if self.metrics is not None:
+            self._send_durations.observe(time.perf_counter() - started_at)
+
+        return failures
+
+    def _send_to(self, follower, message):
+        """
+        Send a direct message to one follower. Returns the raised
+        exception or None on success.
+        """
+
+        self.logger.info("Sending message to \"{}\": \"{}\"".format(
+            follower.screen_name, message))
+
+        try:
+            if self.rate_limiter is None:
+                self._api.send_direct_message(
+                    user_id=follower.id, text=message)
+            else:
+                self.rate_limiter.call(
+                    self._api.send_direct_message,
+                    user_id=follower.id, text=message)
+        except Exception as e:
+            self.logger.error("Error sending message to \"{}\": {}".format(
+                follower.screen_name, e))
+            self._count_api_call("send_direct_message", e)
+            return e
+
+        self._count_api_call("send_direct_message")
+        return None
+
+    def _count_api_call(self, method, error=None):
+        if self.metrics is None:
             return
 
-        for follower in self._get_followers():
-            self.logger.info("Sending message to \"{}\": \"{}\"".format(
-                follower.screen_name, message))
+        self._api_calls.inc(method=method)
+        if error is not None:
+            self._api_errors.inc(method=method)
+
+    def recipients(self, audience, recipient_ids=None):
+        """
+        Returns ids of followers in the audience (restricted to
+        ``recipient_ids``, if informed) or None for all followers.
+        """
+
+        if audience is None or self.audiences is None:
+            return recipient_ids
+
+        self._get_followers()
+
+        ids = self.audiences.recipients(audience)
+        if not ids:
+            self.logger.warning(
+                "No follower in audience {}, message not sent".format(
+                    ", ".join(audience)))
+
+        if recipient_ids is not None:
+            ids &= set(recipient_ids)
+
+        return ids
+
+    def follower_ids(self):
+        """
+        Returns ids of all followers.
+        """
 
-            self._api.send_direct_message(user_id=follower.id, text=message)
+        return [follower.id for follower in self._get_followers()]
 
     def _get_followers(self):
-        if self._followers is None:
-            self._followers = self._api.followers()
+        return self.followers.get()
+
+
+class LazyNotifier(common.loggable):
+    """
+    Notifier proxy that creates the real notifier only when the first
+    message is sent, so executions without messages don't pay for
+    twitter api setup.
+
+    :param factory: A callable returning a
+        :class:`twitter_monitor.core.Notifier` instance.
+    """
 
-        return self._followers
+    def __init__(self, factory):
+        self._factory = factory
+        self._notifier = None
+        self._lock = threading.Lock()
+
+    @property
+    def notifier(self):
+        with self._lock:
+            if self._notifier is None:
+                self.logger.debug("Creating notifier")
+                self._notifier = self._factory()
+
+            return self._notifier
+
+    def send(self, *args, **kwargs):
+        return self.notifier.send(*args, **kwargs)
+
+    def recipients(self, *args, **kwargs):
+        return self.notifier.recipients(*args, **kwargs)
+
+    def follower_ids(self):
+        return self.notifier.follower_ids()
+
+    def flush(self, wait=True):
+        if self._notifier is None or \
+                not callable(getattr(self._notifier, "flush", None)):
+            return
+
+        if wait:
+            self._notifier.flush()
+        else:
+            self._notifier.flush(wait=False)
 
 
 class Routine(common.loggable, metaclass=ABCMeta):
@@ -230,12 +1213,73 @@ class Routine(common.loggable, metaclass=ABCMeta):
 
     interval_minutes = None  #: Interval (in minutes) to execute routine
 
-    _file_last_execution = None  #: Cache of last execution file content
+    #: Interval (in seconds) to execute routine. Use it for intervals
+    #: shorter than a minute (it takes precedence over interval_minutes).
+    interval_seconds = None
+
+    #: Cron expression (like "*/5 * * * *") with times to execute routine.
+    #: It takes precedence over intervals.
+    cron = None
+
+    #: Spread executions of routines with the same interval along it
+    #: (each routine gets a fixed phase from its uid, including its first
+    #: execution). It requires a positive interval.
+    spread_phase = False
+
+    #: Max of random seconds added to execution times by
+    #: :meth:`twitter_monitor.core.Executor.run_forever`.
+    jitter_seconds = 0
+
+    #: Max of seconds a run can take. When exceeded, the executor stops
+    #: waiting, marks the routine as failed and notifies the timeout.
+    timeout_seconds = None
+
+    #: Run this routine in a worker process (see ``processes`` parameter
+    #: of :class:`twitter_monitor.core.Executor`). The class must be
+    #: importable by worker processes.
+    run_in_process = False
+
+    #: Routines (classes) this routine depends on. If one of them fails,
+    #: this routine is skipped. All of them must be in the executor.
+    depends_on = ()
+
+    #: Cache used by :meth:`probe` (set by the executor)
+    probe_cache = None
+
+    #: Deduplicator of messages sent by :meth:`notify` (set by the
+    #: executor). If None, all messages are sent.
+    deduplicator = None
+
+    #: Audience tags (e.g. ``("db", "infra")`` or just ``"db"``). Messages
+    #: go only to followers with any of these tags (see
+    #: :class:`twitter_monitor.routing.AudienceIndex`). If None (default),
+    #: messages go to all followers.
+    audience = None
+
+    #: Status of the last run: "success", "failure", "skipped", "timeout"
+    #: or "blocked" (a dependency failed)
+    last_status = None
+
+    #: Fencing token of the lease held while running (when the executor
+    #: uses leases).
+    lease_token = None
+
+    #: Lease manager (set by the executor when it uses leases). Messages
+    #: and state of a run whose lease was lost are discarded.
+    leases = None
+
+    _uid = None  #: Cache of routine unique id
+
+    _generation = 0  #: Incremented when a run is abandoned
 
     def __init__(self, notifier, key_value_store={}):
         self.notifier = notifier
         self.key_value_store = key_value_store
 
+        # Current run (see _Run) of each thread, so a run abandoned after
+        # a timeout doesn't share its state with the next one.
+        self._local = threading.local()
+
         if self.name is None:
             self.name = self.__class__.__name__
 
@@ -249,25 +1293,106 @@ class Routine(common.loggable, metaclass=ABCMeta):
 
         if self._skip_execution():
             self.logger.info("Skipping execution")
+            self.last_status = "skipped"
             return True
 
-        if self._execute():
-            self._set_last_execution()
+        self._begin_run()
+
+        try:
+            if self._execute():
+                return self._succeeded()
+
+            self._failed()
+            return False
+        finally:
+            self._end_run()
+
+    def abandon(self):
+        """
+        Abandon the current run (e.g. it timed out but can't be
+        stopped). Its status and state are discarded when it finishes.
+        """
+
+        self._generation += 1
+
+    def _begin_run(self):
+        self._local.run = _Run(self._generation)
+
+    def _end_run(self):
+        self._local.run = None
+
+    def _current_run(self):
+        return getattr(self._local, "run", None)
+
+    def _succeeded(self):
+        """
+        Save state of a successful run (last execution and checkpoint).
+        Returns False (discarding the state) if the run was abandoned or
+        the routine lost its lease while running.
+        """
+
+        if self._abandoned():
+            return False
+
+        if not self._holds_lease():
+            self._failed()
+            return False
+
+        self._save_checkpoint()
+        self._set_last_execution()
+        self.last_status = "success"
+
+        return True
+
+    def _failed(self):
+        if self._abandoned():
+            return
+
+        self.last_status = "failure"
+
+    def _abandoned(self):
+        """
+        Returns True if the current run was abandoned, so its messages
+        and results must be discarded.
+        """
+
+        run = self._current_run()
+        if run is None or run.generation == self._generation:
+            return False
+
+        self.logger.warning("Run abandoned, discarding results")
+        return True
+
+    def _holds_lease(self):
+        """
+        Returns False if the lease this routine runs with expired or was
+        taken by another node.
+        """
+
+        if self.leases is None or self.lease_token is None:
             return True
 
-        return False
+        try:
+            valid = self.leases.is_valid(self.uid, self.lease_token)
+        except Exception as e:
+            self.logger.error("Error checking lease: " + str(e))
+            return False
+
+        if not valid:
+            self.logger.warning("Lease lost, discarding results")
+
+        return valid
 
     def _skip_execution(self):
-        if self.interval_minutes is None or self.last_execution is None:
+        next_execution = self._next_execution_time()
+        if next_execution is None:
             return False
 
-        timedelta_compare = datetime.timedelta(minutes=self.interval_minutes)
+        remaining = next_execution - time.time()
 
-        diff = datetime.datetime.now() - self.last_execution
-
-        if diff < timedelta_compare:
-            message = "Interval not reached. Elapsed {} minutes"
-            self.logger.info(message.format(diff.seconds/60))
+        if remaining > 0:
+            message = "Interval not reached. Next execution in {} minutes"
+            self.logger.info(message.format(remaining / 60))
             return True
 
         return False
@@ -296,12 +1421,26 @@ class Routine(common.loggable, metaclass=ABCMeta):
         Returns a datetime object with last execution of routine
         """
 
+        last_execution = self._last_execution_time()
+        if last_execution is None:
+            return None
+
+        return datetime.datetime.fromtimestamp(last_execution)
+
+    def _last_execution_time(self):
+        """
+        Returns last execution time in seconds since epoch or None.
+        """
+
         self.logger.debug("Finding last execution time")
 
         try:
-            if self.uid in self.key_value_store:
-                val = self.key_value_store[self.uid]
-                return datetime.datetime.strptime(val, "%Y-%m-%d %H:%M:%S.%f")
+            get_timestamp = getattr(
+                self.key_value_store, "get_timestamp", None)
+            if get_timestamp is not None:
+                return get_timestamp(self.uid)
+
+            return parse_timestamp(self.key_value_store.get(self.uid))
         except Exception as e:
             self.logger.debug(
                 "Exception - Method/property 'last_execution': " + str(e))
@@ -309,13 +1448,137 @@ class Routine(common.loggable, metaclass=ABCMeta):
         return None
 
     def _set_last_execution(self, val=None):
-        now_str = datetime.datetime.now().isoformat(" ")
-        now_str = now_str if val is None else val
-
         self.logger.debug(
-            "Setting last execution file content to: '{}'".format(now_str))
+            "Setting last execution file content to: '{}'".format(val))
+
+        if val is not None:
+            self.key_value_store[self.uid] = val
+            return
+
+        set_timestamp = getattr(self.key_value_store, "set_timestamp", None)
+        if set_timestamp is not None:
+            set_timestamp(self.uid, time.time())
+        else:
+            self.key_value_store[self.uid] = format_timestamp(time.time())
+
+    @property
+    def next_execution(self):
+        """
+        Returns a datetime object with the next time this routine is due
+        or None if it must run on every execution.
+        """
+
+        next_execution = self._next_execution_time()
+        if next_execution is None:
+            return None
+
+        return datetime.datetime.fromtimestamp(next_execution)
+
+    def _next_execution_time(self):
+        schedule = self.schedule
+        if schedule is None:
+            return None
+
+        return schedule.next_due(self._last_execution_time(), time.time())
+
+    @property
+    def schedule(self):
+        """
+        Returns the schedule of this routine (built from cron or interval
+        attributes) or None if it runs on every execution.
+        """
+
+        if self.cron is not None:
+            return CronSchedule(self.cron)
+
+        seconds = self.interval_seconds
+        if seconds is None and self.interval_minutes is not None:
+            seconds = self.interval_minutes * 60
+
+        if seconds is None:
+            return None
+
+        phase = None
+        if self.spread_phase:
+            phase = int(self.uid[:8], 16) % int(max(seconds, 1))
 
-        self.key_value_store[self.uid] = now_str
+        return IntervalSchedule(seconds, phase)
+
+    @property
+    def checkpoint(self):
+        """
+        Value saved by the last successful run (None if there isn't
+        one). Use it to resume incremental work, like the last seen id
+        or offset::
+
+            def _execute(self):
+                last_id = self.checkpoint or 0
+                ...
+                self.checkpoint = new_last_id
+                return True
+
+        Values must be JSON serializable. A value set during a run is
+        only saved if the run succeeds, together with last execution
+        time (outside a run, it's saved right away).
+        """
+
+        run = self._current_run()
+        if run is not None and run.checkpoint is not _NO_CHECKPOINT:
+            return run.checkpoint
+
+        try:
+            value = self.key_value_store.get(self._checkpoint_key)
+            if isinstance(value, bytes):
+                value = value.decode("utf-8")
+
+            if value:
+                return json.loads(value)
+        except Exception as e:
+            self.logger.debug(
+                "Exception - Method/property 'checkpoint': " + str(e))
+
+        return None
+
+    @checkpoint.setter
+    def checkpoint(self, value):
+        run = self._current_run()
+        if run is not None:
+            run.checkpoint = value
+            return
+
+        self.key_value_store[self._checkpoint_key] = json.dumps(
+            value, separators=(",", ":"))
+
+    def clear_checkpoint(self):
+        """
+        Clear checkpoint of this routine
+        """
+
+        run = self._current_run()
+        if run is not None:
+            run.checkpoint = _NO_CHECKPOINT
+
+        self.key_value_store[self._checkpoint_key] = ""
+
+    def _save_checkpoint(self):
+        run = self._current_run()
+        if run is None or run.checkpoint is _NO_CHECKPOINT:
+            return
+
+        self.key_value_store[self._checkpoint_key] = json.dumps(
+            run.checkpoint, separators=(",", ":"))
+        run.checkpoint = _NO_CHECKPOINT
+
+    @property
+    def _checkpoint_key(self):
+        return self.uid + ":checkpoint"
+
+    def _state_keys(self):
+        """
+        Keys this routine uses in key-value store.
+        """
+
+        return [self.uid, self._checkpoint_key]
 
     @property
     def uid(self):
@@ -323,17 +1586,89 @@ class Routine(common.loggable, metaclass=ABCMeta):
         Routine unique id (md5 format)
         """
 
-        name = "{} {} {}".format(
-            self.__class__.__name__, self.name, self.short_name)
+        if self._uid is None:
+            name = "{} {} {}".format(
+                self.__class__.__name__, self.name, self.short_name)
+
+            m = hashlib.md5()
+            m.update(name.encode("ascii", errors="ignore"))
+
+            self._uid = m.hexdigest()
+
+        return self._uid
+
+    def probe(self, name, fetch, *args, ttl=None, **kwargs):
+        """
+        Returns ``fetch(*args, **kwargs)`` memoized in the executor
+        probe cache, so routines querying the same source share a
+        single fetch::
+
+            status = self.probe("status", requests.get, STATUS_URL, ttl=30)
+
+        :param name: Probe name (entries are keyed by name and arguments).
+        :param fetch: Function fetching the value.
+        :param ttl: Seconds the value is valid (default from cache).
+        """
 
-        m = hashlib.md5()
-        m.update(name.encode("ascii", errors="ignore"))
+        if self.probe_cache is None:
+            return fetch(*args, **kwargs)
 
-        return m.hexdigest()
+        return self.probe_cache.get(name, fetch, *args, ttl=ttl, **kwargs)
 
-    def notify(self, message):
+    def notify(self, message, urgent=False):
         """
         Send the message
+
+        :param urgent: If True, notifiers that buffer messages (like
+            :class:`twitter_monitor.digest.DigestNotifier`) send it
+            right away.
+        """
+
+        new_message = self._prepare_message(message)
+        if new_message is None:
+            return
+
+        self.notifier.send(new_message, **self._send_options(urgent))
+
+    def _prepare_message(self, message):
+        """
+        Format the message, returning None if it must not be sent
+        (empty, repeated, the run was abandoned or the routine lost its
+        lease).
+        """
+
+        new_message = self._format_message(message)
+
+        if new_message is not None and \
+                (self._abandoned() or not self._holds_lease()):
+            return None
+
+        if new_message is not None and self.deduplicator is not None:
+            new_message = self.deduplicator.check(self.uid, new_message)
+
+        return new_message
+
+    def _send_options(self, urgent=False):
+        """
+        Keyword arguments of notifier ``send`` (only the ones differing
+        from defaults, so any notifier works with plain messages).
+        """
+
+        options = {}
+        if urgent:
+            options["urgent"] = True
+
+        if isinstance(self.audience, str):
+            options["audience"] = (self.audience,)
+        elif self.audience is not None:
+            options["audience"] = tuple(self.audience)
+
+        return options
+
+    def _format_message(self, message):
+        """
+        Prefix the message with routine short name. Returns None
+        for empty messages.
         """
 
         if not isinstance(message, str):
@@ -341,12 +1676,82 @@ class Routine(common.loggable, metaclass=ABCMeta):
 
         if len(message.strip()) == 0:
             self.logger.debug("Empty message")
-            return
-
-        new_message = "{}: {}".format(
-            self.short_name, message)
+            return None
 
-        self.notifier.send(new_message)
+        return "{}: {}".format(self.short_name, message)
 
     def __str__(self):
         return "Routine '{}'".format(self.name)
+
+
+class _ProcessTask(object):
+    """
+    A routine submitted to a worker process: the pool running it, the
+    queue where workers of the pool report started tasks and the future
+    of its result.
+    """
+
+    def __init__(self, id, pool, starts_queue, future):
+        self.id = id
+        self.pool = pool
+        self.starts_queue = starts_queue
+        self.future = future
+
+
+class _Run(object):
+    """
+    State of a routine run.
+    """
+
+    def __init__(self, generation):
+        self.generation = generation  #: Routine generation at start
+        self.checkpoint = _NO_CHECKPOINT  #: Checkpoint set in this run
+
+
+class _MessageCollector(object):
+    """
+    Notifier used in worker processes. It keeps messages to be sent by
+    the parent process notifier.
+    """
+
+    def __init__(self):
+        self.messages = []
+
+    def send(self, *args, **kwargs):
+        self.messages.append((args, kwargs))
+        return []
+
+
+def _init_process(starts_queue):
+    """
+    Initialize a worker process.
+    """
+
+    global _started_tasks
+    _started_tasks = starts_queue
+
+
+def _run_in_process(class_ref, state, task_id=None):
+    """
+    Run a routine in a worker process. Returns a tuple with the success
+    flag, messages to send and the routine state.
+    """
+
+    if _started_tasks is not None and task_id is not None:
+        _started_tasks.put((task_id, time.time()))
+
+    notifier = _MessageCollector()
+    key_value_store = StateCache(MemoryStore())
+    key_value_store.update(state)
+
+    rt = class_ref(notifier, key_value_store)
+
+    try:
+        success = rt.run()
+    except Exception as e:
+        rt.logger.error(
+            "Exception on running routine \"{}\": {}".format(str(rt), e))
+        success = False
+
+    return success, notifier.messages, key_value_store.get_many(
+        rt._state_keys())
@@ -0,0 +1,152 @@
+# -*- coding: UTF-8 -*-
+
+from . import common
+import collections
+import hashlib
+import json
+import threading
+import time
+
+
+def fingerprint(message):
+    """
+    Returns a fingerprint of a message, ignoring differences in
+    whitespace.
+    """
+
+    normalized = " ".join(message.split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+class Deduplicator(common.loggable):
+    """
+    Suppresses repeated messages of a routine. A message is sent once
+    per window (keyed by routine uid and message fingerprint) and its
+    repetitions are counted. When the window ends, a summary ("repeated
+    N times") is sent, so no information is lost. A flapping check
+    alternating between messages sends each of them once per window.
+
+    The index is kept in memory (least recent windows are evicted when
+    it's full) and persisted to a key-value store with :meth:`save`.
+
+    :param store: A dictionary like storage to persist the index. The
+        executor uses routines state if None.
+    :param window_seconds: Seconds a message is suppressed after sent.
+    :param max_entries: Max of entries kept.
+    :param clock: Function returning current time in seconds.
+    """
+
+    key = "twitter-monitor:dedup"  #: Key used in key-value store
+
+    def __init__(self, store=None, window_seconds=3600, max_entries=1024,
+                 clock=time.time):
+        self.store = store
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+
+        # uid:fingerprint => [window start, repetitions, message]
+        self._entries = None
+        self._lock = threading.RLock()
+
+    def check(self, uid, message):
+        """
+        Returns the message to send (with the summary of repetitions of
+        the previous window, if any) or None if it must be suppressed.
+
+        :param uid: Routine unique id.
+        :param message: Message to send.
+        """
+
+        key = "{}:{}".format(uid, fingerprint(message))
+        now = self._clock()
+
+        with self._lock:
+            entries = self._load()
+            entry = entries.get(key)
+
+            if entry is not None and entry[0] + self.window_seconds > now:
+                entry[1] += 1
+                self.logger.debug("Suppressed repeated message")
+                return None
+
+            if entry is not None:
+                del entries[key]
+
+                if entry[1] > 0:
+                    message = self._summary(message, entry[1])
+
+            entries[key] = [now, 0, message]
+
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+        return message
+
+    def expired(self):
+        """
+        Remove entries whose window ended, returning a list of
+        ``(uid, summary)`` tuples for the ones with suppressed messages.
+        """
+
+        now = self._clock()
+        summaries = []
+
+        with self._lock:
+            entries = self._load()
+
+            for key in list(entries):
+                started, count, message = entries[key]
+                if started + self.window_seconds > now:
+                    continue
+
+                del entries[key]
+
+                if count > 0:
+                    uid = key.rsplit(":", 1)[0]
+                    summaries.append((uid, self._summary(message, count)))
+
+        return summaries
+
+    def save(self):
+        """
+        Persist the index to the key-value store.
+        """
+
+        if self.store is None:
+            return
+
+        with self._lock:
+            if self._entries is None:
+                return
+
+            self.store[self.key] = json.dumps(list(self._entries.items()))
+
+    def _load(self):
+        if self._entries is not None:
+            return self._entries
+
+        self._entries = collections.OrderedDict()
+
+        if self.store is None:
+            return self._entries
+
+        try:
+            value = self.store.get(self.key)
+            if isinstance(value, bytes):
+                value = value.decode("utf-8")
+
+            if value:
+                self._entries.update(
+                    (key, list(entry)) for key, entry in json.loads(value))
+        except ValueError as e:
+            self.logger.error("Invalid dedup index: " + str(e))
+
+        return self._entries
+
+    def _summary(self, message, count):
+        return "{} (repeated {} times)".format(message, count)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._load())
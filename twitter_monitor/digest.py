@@ -0,0 +1,187 @@
+# -*- coding: UTF-8 -*-
+
+from . import common
+import threading
+import time
+
+#: Max of characters in a direct message
+DM_MAX_LENGTH = 10000
+
+
+class DigestNotifier(common.loggable):
+    """
+    Notifier front-end that buffers messages and, on :meth:`flush`, sends
+    them coalesced: messages to the same follower are joined in as few
+    direct messages as possible (up to ``max_length`` characters each).
+    Executors flush notifiers at the end of each cycle.
+
+    :param notifier: An instance of :class:`twitter_monitor.core.Notifier`
+        (or any object with the same ``send`` method).
+    :param max_length: Max of characters in a direct message.
+    :param max_hold_seconds: If informed, buffered messages are flushed
+        when the oldest one is held for longer than this.
+    :param separator: Text between coalesced messages.
+    """
+
+    def __init__(self, notifier, max_length=DM_MAX_LENGTH,
+                 max_hold_seconds=None, separator="\n", clock=time.time):
+        self.notifier = notifier
+        self.max_length = max_length
+        self.max_hold_seconds = max_hold_seconds
+        self.separator = separator
+        self._clock = clock
+
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    def send(self, message, recipient_ids=None, urgent=False,
+             audience=None):
+        """
+        Buffer a message. Urgent messages are sent right away.
+
+        :param message: A message to send.
+        :param recipient_ids: Ids of recipients (None for all followers).
+        :param urgent: If True, the message skips the buffer.
+        :param audience: Audience tags (None for all followers).
+        """
+
+        if urgent:
+            return self._send(message, recipient_ids, audience)
+
+        with self._lock:
+            self._buffer.append(
+                (self._clock(), message, recipient_ids, audience))
+            expired = self.max_hold_seconds is not None and \
+                self._clock() - self._buffer[0][0] >= self.max_hold_seconds
+
+        if expired:
+            self.flush()
+
+        return []
+
+    def flush(self, wait=True):
+        """
+        Send buffered messages coalesced, so each follower gets one
+        direct message per cycle (unless they don't fit in one).
+        Messages are resolved to follower ids when the notifier can
+        list them (see :meth:`twitter_monitor.core.Notifier.recipients`
+        and :meth:`twitter_monitor.core.Notifier.follower_ids`), otherwise
+        they are coalesced by recipient ids and audience.
+
+        :param wait: If False, the wrapped notifier isn't waited for
+            (e.g. a :class:`twitter_monitor.pipeline.DeliveryPipeline`
+            keeps delivering in background).
+        """
+
+        with self._lock:
+            buffer, self._buffer = self._buffer, []
+
+        # Follower id => messages (keeping the order they were sent)
+        by_follower = {}
+
+        # (Recipient ids, audience) => messages not resolved to followers
+        unresolved = {}
+
+        for _, message, recipient_ids, audience in buffer:
+            follower_ids = self._follower_ids(recipient_ids, audience)
+
+            if follower_ids is None:
+                key = (self._key(recipient_ids), self._key(audience))
+                unresolved.setdefault(key, []).append(message)
+                continue
+
+            for follower_id in follower_ids:
+                by_follower.setdefault(follower_id, []).append(message)
+
+        # Followers with the same messages share the same sends
+        shared = {}
+        for follower_id, messages in by_follower.items():
+            shared.setdefault(tuple(messages), []).append(follower_id)
+
+        groups = [(ids, None, messages) for messages, ids in shared.items()]
+        groups.extend((recipient_ids, audience, messages)
+                      for (recipient_ids, audience), messages
+                      in unresolved.items())
+
+        for recipient_ids, audience, messages in groups:
+            if recipient_ids is not None:
+                recipient_ids = list(recipient_ids)
+
+            for chunk in self._chunks(messages):
+                try:
+                    self._send(chunk, recipient_ids, audience)
+                except Exception as e:
+                    self.logger.error("Error sending digest: " + str(e))
+
+        if callable(getattr(self.notifier, "flush", None)):
+            if wait:
+                self.notifier.flush()
+            else:
+                self.notifier.flush(wait=False)
+
+    def stop(self):
+        """
+        Send buffered messages and stop the wrapped notifier (if it
+        has background workers).
+        """
+
+        self.flush()
+
+        if callable(getattr(self.notifier, "stop", None)):
+            self.notifier.stop()
+
+    def _follower_ids(self, recipient_ids, audience):
+        """
+        Returns ids of followers receiving a message or None if the
+        notifier can't resolve them.
+        """
+
+        recipients = getattr(self.notifier, "recipients", None)
+        follower_ids = getattr(self.notifier, "follower_ids", None)
+        if not callable(recipients) or not callable(follower_ids):
+            return None
+
+        try:
+            ids = recipients(audience, recipient_ids)
+            if ids is None:
+                ids = follower_ids()
+        except Exception as e:
+            self.logger.error("Error resolving recipients: " + str(e))
+            return None
+
+        return sorted(set(ids))
+
+    def _send(self, message, recipient_ids, audience):
+        if audience is None:
+            return self.notifier.send(message, recipient_ids)
+
+        return self.notifier.send(message, recipient_ids, audience=audience)
+
+    def _key(self, values):
+        return None if values is None else tuple(sorted(set(values)))
+
+    def _chunks(self, messages):
+        """
+        Join messages in chunks with up to ``max_length`` characters.
+        Longer messages are split.
+        """
+
+        chunk = None
+
+        for message in messages:
+            for part in self._split(message):
+                if chunk is None:
+                    chunk = part
+                elif len(chunk) + len(self.separator) + len(part) \
+                        <= self.max_length:
+                    chunk += self.separator + part
+                else:
+                    yield chunk
+                    chunk = part
+
+        if chunk is not None:
+            yield chunk
+
+    def _split(self, message):
+        for i in range(0, max(len(message), 1), self.max_length):
+            yield message[i:i + self.max_length]
@@ -0,0 +1,221 @@
+# -*- coding: UTF-8 -*-
+
+from . import common
+import collections
+import json
+import threading
+import time
+
+#: Minimal follower representation kept in cache
+Follower = collections.namedtuple("Follower", ["id", "screen_name"])
+
+
+class FollowerCache(common.loggable):
+    """
+    Keeps the full list of followers, paging through twitter API with
+    cursors. The list is persisted in a key-value store and refreshed when
+    older than ``ttl_seconds``. Refreshes are incremental: only follower
+    ids are paged and just the new ones are looked up.
+
+    :param api: An API instance (for now, we are using Tweepy)
+    :param key_value_store: A dictionary like storage used to persist
+        the list between executions.
+    :param ttl_seconds: Seconds before the list is considered stale.
+    :param background: If True (default) a stale list is still returned
+        while it is refreshed in a background thread.
+    :param metrics: A :class:`twitter_monitor.metrics.Registry` to count
+        API calls. If None (default), nothing is recorded.
+
+    Listeners (see :meth:`add_listener`) are told about followers added
+    and removed whenever the list changes.
+    """
+
+    key = "twitter-monitor:followers"  #: Key used in key-value store
+
+    lookup_size = 100  #: Max of users per lookup request
+
+    def __init__(self, api, key_value_store=None, ttl_seconds=3600,
+                 background=True, metrics=None):
+        self._api = api
+        self.metrics = metrics
+        self.key_value_store = {} if key_value_store is None \
+            else key_value_store
+        self.ttl_seconds = ttl_seconds
+        self.background = background
+
+        self._followers = None
+        self._updated_at = 0
+        self._lock = threading.RLock()
+        self._refresh_thread = None
+        self._listeners = []
+
+        if metrics is not None:
+            self._api_calls = metrics.counter(
+                "twitter_monitor_api_calls_total",
+                "Twitter API calls", ["method"])
+            self._api_errors = metrics.counter(
+                "twitter_monitor_api_errors_total",
+                "Twitter API calls with errors", ["method"])
+
+    def add_listener(self, listener):
+        """
+        Register a callable receiving ``(added, removed)`` lists of
+        followers when the list changes. If the list is already loaded,
+        the listener receives it as added right away.
+        """
+
+        with self._lock:
+            self._listeners.append(listener)
+
+            if self._followers:
+                listener(list(self._followers), [])
+
+    def get(self):
+        """
+        Returns a list of :class:`twitter_monitor.followers.Follower`.
+        """
+
+        with self._lock:
+            if self._followers is None:
+                self._load()
+
+            if self._followers is None:
+                self.refresh()
+            elif self.is_stale():
+                self._refresh_stale()
+
+            return self._followers
+
+    def is_stale(self):
+        return time.time() - self._updated_at >= self.ttl_seconds
+
+    def refresh(self):
+        """
+        Fetch follower ids from API, looking up only new followers,
+        and persist the result.
+        """
+
+        self.logger.debug("Refreshing followers")
+
+        known = {}
+        with self._lock:
+            for follower in self._followers or []:
+                known[follower.id] = follower
+
+        ids = self._fetch_ids()
+        new_ids = [i for i in ids if i not in known]
+        known.update((f.id, f) for f in self._lookup(new_ids))
+
+        followers = [known[i] for i in ids if i in known]
+
+        with self._lock:
+            current, new = set(ids), set(new_ids)
+            removed = [f for f in self._followers or []
+                       if f.id not in current]
+            added = [f for f in followers if f.id in new]
+
+            self._followers = followers
+            self._updated_at = time.time()
+            self._save()
+            self._changed(added, removed)
+
+        self.logger.debug("{} followers ({} new)".format(
+            len(followers), len(new_ids)))
+
+        return followers
+
+    def _refresh_stale(self):
+        if not self.background:
+            self.refresh()
+            return
+
+        if self._refresh_thread is not None \
+                and self._refresh_thread.is_alive():
+            return
+
+        self._refresh_thread = threading.Thread(
+            target=self._refresh_quietly, daemon=True)
+        self._refresh_thread.start()
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            self.logger.error("Error refreshing followers: " + str(e))
+
+    def _fetch_ids(self):
+        ids = []
+        cursor = -1
+
+        while cursor:
+            page, (_, cursor) = self._call_api(
+                "followers_ids", cursor=cursor)
+            ids.extend(page)
+
+        return ids
+
+    def _lookup(self, ids):
+        followers = []
+
+        for i in range(0, len(ids), self.lookup_size):
+            users = self._call_api(
+                "lookup_users", user_ids=ids[i:i + self.lookup_size])
+
+            followers.extend(Follower(u.id, u.screen_name) for u in users)
+
+        return followers
+
+    def _call_api(self, method, **kwargs):
+        """
+        Call an API method, counting calls and errors.
+        """
+
+        try:
+            result = getattr(self._api, method)(**kwargs)
+        except Exception:
+            if self.metrics is not None:
+                self._api_calls.inc(method=method)
+                self._api_errors.inc(method=method)
+            raise
+
+        if self.metrics is not None:
+            self._api_calls.inc(method=method)
+
+        return result
+
+    def _load(self):
+        try:
+            value = self.key_value_store.get(self.key)
+            if value is None:
+                return
+
+            if isinstance(value, bytes):
+                value = value.decode("utf-8")
+
+            data = json.loads(value)
+        except Exception as e:
+            self.logger.debug("Exception - Loading followers: " + str(e))
+            return
+
+        self._followers = [Follower(*f) for f in data["followers"]]
+        self._updated_at = data["updated_at"]
+        self._changed(self._followers, [])
+
+    def _changed(self, added, removed):
+        if not added and not removed:
+            return
+
+        for listener in self._listeners:
+            try:
+                listener(added, removed)
+            except Exception as e:
+                self.logger.error("Error on followers listener: " + str(e))
+
+    def _save(self):
+        data = {
+            "updated_at": self._updated_at,
+            "followers": [list(f) for f in self._followers],
+        }
+
+        self.key_value_store[self.key] = json.dumps(
+            data, separators=(",", ":"))
@@ -0,0 +1,186 @@
+# -*- coding: UTF-8 -*-
+
+from . import common
+import array
+import collections
+import os
+import struct
+import threading
+import time
+
+#: Statuses kept in history (index is the value saved in records)
+STATUSES = ("success", "failure", "skipped", "timeout", "blocked")
+
+#: Statuses counted as failed runs
+FAILED_STATUSES = ("failure", "timeout")
+
+_MAGIC = b"TMH1"
+
+#: File header: magic, capacity and number of records appended
+_HEADER = struct.Struct("<4sIQ")
+
+#: Record: timestamp, duration (seconds) and status
+_RECORD = struct.Struct("<dfB3x")
+
+#: Summary of runs returned by :meth:`History.stats`
+HistoryStats = collections.namedtuple(
+    "HistoryStats", ["runs", "failures", "failure_rate", "p50", "p95", "p99"])
+
+
+def percentile(values, p):
+    """
+    Returns the ``p`` percentile (nearest rank) of sorted values or None
+    if there are no values.
+    """
+
+    if not values:
+        return None
+
+    rank = max(1, -(-len(values) * p // 100))
+    return values[int(rank) - 1]
+
+
+class History(common.loggable):
+    """
+    Execution history of routines. Each routine has a ring buffer file
+    with fixed-size records (timestamp, duration and status), so
+    appending is a single write and the file never grows past
+    ``capacity`` records. Queries stream records from the file.
+
+    :param directory: Directory of history files (created if missing).
+    :param capacity: Max of records kept per routine (oldest ones are
+        overwritten).
+    """
+
+    block_size = 1024  #: Records read at once by queries
+
+    def __init__(self, directory, capacity=10080):
+        self.directory = directory
+        self.capacity = capacity
+
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def record(self, uid, timestamp, duration, status):
+        """
+        Append the outcome of a routine run.
+
+        :param uid: Routine unique id.
+        :param timestamp: When the run started (seconds since epoch).
+        :param duration: Duration of the run in seconds.
+        :param status: One of :data:`STATUSES`.
+        """
+
+        data = _RECORD.pack(timestamp, duration, STATUSES.index(status))
+
+        with self._lock:
+            with self._open(uid) as f:
+                capacity, count = self._read_header(f)
+
+                f.seek(_HEADER.size + (count % capacity) * _RECORD.size)
+                f.write(data)
+
+                f.seek(0)
+                f.write(_HEADER.pack(_MAGIC, capacity, count + 1))
+
+    def records(self, uid, since=None, until=None):
+        """
+        Iterate ``(timestamp, duration, status)`` tuples of a routine
+        (from oldest to newest) within the given window. Records are
+        read in blocks of ``block_size``.
+        """
+
+        path = self._path(uid)
+        if not os.path.exists(path):
+            return
+
+        with open(path, "rb") as f:
+            with self._lock:
+                capacity, count = self._read_header(f)
+
+            size = min(count, capacity)
+            start = count % capacity if count > capacity else 0
+
+            # Oldest records are after the write position
+            for index in range(0, size, self.block_size):
+                first = start + index
+                last = start + min(index + self.block_size, size)
+
+                with self._lock:
+                    chunk = self._read(f, first, min(last, capacity))
+                    if last > capacity:
+                        chunk += self._read(f, max(first, capacity) -
+                                            capacity, last - capacity)
+
+                for timestamp, duration, status in \
+                        _RECORD.iter_unpack(chunk):
+                    if since is not None and timestamp < since:
+                        continue
+
+                    if until is not None and timestamp > until:
+                        continue
+
+                    yield timestamp, duration, STATUSES[status]
+
+    def stats(self, uid, window_seconds=None, now=None):
+        """
+        Returns a :data:`HistoryStats` of runs in the last
+        ``window_seconds`` (all runs if None). Skipped and blocked runs
+        are left out. Percentiles are None without runs.
+        """
+
+        now = time.time() if now is None else now
+        since = None if window_seconds is None else now - window_seconds
+
+        durations = array.array("f")
+        failures = 0
+
+        for _, duration, status in self.records(uid, since, now):
+            if status in ("skipped", "blocked"):
+                continue
+
+            durations.append(duration)
+            if status in FAILED_STATUSES:
+                failures += 1
+
+        durations = sorted(durations)
+        runs = len(durations)
+
+        return HistoryStats(
+            runs=runs,
+            failures=failures,
+            failure_rate=failures / runs if runs else 0.0,
+            p50=percentile(durations, 50),
+            p95=percentile(durations, 95),
+            p99=percentile(durations, 99))
+
+    def _path(self, uid):
+        return os.path.join(self.directory, uid + ".hist")
+
+    def _open(self, uid):
+        path = self._path(uid)
+
+        try:
+            return open(path, "r+b")
+        except FileNotFoundError:
+            pass
+
+        f = open(path, "w+b")
+        f.write(_HEADER.pack(_MAGIC, self.capacity, 0))
+        return f
+
+    def _read(self, f, first, last):
+        if last <= first:
+            return b""
+
+        f.seek(_HEADER.size + first * _RECORD.size)
+        return f.read((last - first) * _RECORD.size)
+
+    def _read_header(self, f):
+        f.seek(0)
+        magic, capacity, count = _HEADER.unpack(f.read(_HEADER.size))
+
+        if magic != _MAGIC:
+            raise ValueError("Invalid history file: " + f.name)
+
+        return capacity, count
@@ -0,0 +1,120 @@
+# -*- coding: UTF-8 -*-
+
+from . import common
+import os
+import socket
+import threading
+import time
+
+
+class SQLiteLeaseManager(common.loggable):
+    """
+    Time-bound leases kept in a SQLite database shared by many nodes
+    (hosts running the same routines). Only the node holding the lease of
+    a routine runs it. A lease not renewed before it expires can be taken
+    by another node.
+
+    Each time a lease changes owner its fencing token is incremented, so
+    a node can check (with :meth:`is_valid`) that it still holds the
+    lease before doing anything that can't be repeated.
+
+    :param path: Database file path (shared by all nodes).
+    :param owner: This node identifier. Defaults to hostname and pid.
+    """
+
+    def __init__(self, path, owner=None):
+        import sqlite3
+
+        if owner is None:
+            owner = "{}:{}".format(socket.gethostname(), os.getpid())
+
+        self.path = path
+        self.owner = owner
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(
+            path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS leases ("
+            " key TEXT PRIMARY KEY,"
+            " owner TEXT NOT NULL,"
+            " token INTEGER NOT NULL,"
+            " expires REAL NOT NULL)")
+
+    def acquire(self, key, ttl, now=None):
+        """
+        Acquire (or renew) the lease of ``key`` for ``ttl`` seconds.
+        Returns the fencing token or None if the lease is held by
+        another node.
+        """
+
+        now = time.time() if now is None else now
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+
+            try:
+                token = self._acquire(key, ttl, now)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+            self._conn.execute("COMMIT")
+
+        return token
+
+    def _acquire(self, key, ttl, now):
+        row = self._conn.execute(
+            "SELECT owner, token, expires FROM leases WHERE key = ?",
+            (key,)).fetchone()
+
+        if row is None:
+            self._conn.execute(
+                "INSERT INTO leases (key, owner, token, expires)"
+                " VALUES (?, ?, 1, ?)", (key, self.owner, now + ttl))
+            return 1
+
+        owner, token, expires = row
+
+        if owner != self.owner:
+            if expires > now:
+                return None
+
+            token += 1
+
+        self._conn.execute(
+            "UPDATE leases SET owner = ?, token = ?, expires = ?"
+            " WHERE key = ?", (self.owner, token, now + ttl, key))
+
+        return token
+
+    def release(self, key, token):
+        """
+        Release a lease held by this node.
+        """
+
+        with self._lock:
+            self._conn.execute(
+                "UPDATE leases SET expires = 0"
+                " WHERE key = ? AND owner = ? AND token = ?",
+                (key, self.owner, token))
+
+    def is_valid(self, key, token, now=None):
+        """
+        Returns True if this node still holds the lease with ``token``.
+        """
+
+        now = time.time() if now is None else now
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT owner, token, expires FROM leases WHERE key = ?",
+                (key,)).fetchone()
+
+        return row is not None and row[0] == self.owner \
+            and row[1] == token and row[2] > now
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
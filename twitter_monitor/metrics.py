@@ -0,0 +1,240 @@
+# -*- coding: UTF-8 -*-
+
+from . import common
+import bisect
+import os
+import tempfile
+import threading
+
+#: Default histogram buckets (seconds)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                   30, 60)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n") \
+        .replace("\"", "\\\"")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+
+    return "{" + ",".join("{}=\"{}\"".format(name, _escape(value))
+                          for name, value in labels) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(object):
+    """
+    Base class of metrics. Values are kept by label values.
+
+    :param name: Metric name.
+    :param help: Metric description.
+    :param labelnames: Names of the labels of this metric.
+    """
+
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        """
+        Returns this metric in Prometheus text format.
+        """
+
+        lines = [
+            "# HELP {} {}".format(self.name, _escape(self.help)),
+            "# TYPE {} {}".format(self.name, self.type),
+        ]
+
+        with self._lock:
+            items = sorted(self._values.items())
+
+        for key, value in items:
+            lines.extend(self._render_value(
+                list(zip(self.labelnames, key)), value))
+
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """
+    Metric that only goes up.
+    """
+
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _render_value(self, labels, value):
+        yield "{}{} {}".format(
+            self.name, _format_labels(labels), _format_value(value))
+
+
+class Histogram(Metric):
+    """
+    Metric counting observations in buckets.
+
+    :param buckets: Upper bounds of buckets.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # Bucket counts, sum and count
+                counts = self._values[key] = [0] * (len(self.buckets) + 3)
+
+            counts[index] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def count(self, **labels):
+        with self._lock:
+            counts = self._values.get(self._key(labels))
+            return 0 if counts is None else counts[-1]
+
+    def _render_value(self, labels, counts):
+        total = 0
+
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            total += count
+            yield "{}_bucket{} {}".format(
+                self.name,
+                _format_labels(labels + [("le", _format_value(float(bound)))]),
+                total)
+
+        yield "{}_sum{} {}".format(
+            self.name, _format_labels(labels), _format_value(counts[-2]))
+        yield "{}_count{} {}".format(
+            self.name, _format_labels(labels), counts[-1])
+
+
+class Registry(common.loggable):
+    """
+    Keeps metrics and exports them in Prometheus text format.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, help, labelnames=()):
+        """
+        Returns the counter ``name`` (created if needed).
+        """
+
+        return self._get(Counter, name, help, labelnames)
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """
+        Returns the histogram ``name`` (created if needed).
+        """
+
+        return self._get(Histogram, name, help, labelnames, buckets=buckets)
+
+    def _get(self, metric_class, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+
+            if metric is None:
+                metric = metric_class(name, *args, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, metric_class):
+                raise ValueError(
+                    "Metric \"{}\" already registered as {}".format(
+                        name, metric.type))
+
+            return metric
+
+    def render(self):
+        """
+        Returns all metrics in Prometheus text format.
+        """
+
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+
+        return "".join(metric.render() + "\n" for _, metric in metrics)
+
+    def write_textfile(self, path):
+        """
+        Write metrics to ``path`` (e.g. to be read by node exporter
+        textfile collector). The file is replaced atomically.
+        """
+
+        dir = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=dir, prefix=".metrics")
+
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(self.render())
+
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def serve(self, port, host=""):
+        """
+        Serve metrics over HTTP in a background thread. Returns the
+        server (call ``shutdown()`` to stop it).
+        """
+
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                body = registry.render().encode("utf-8")
+
+                self.send_response(200)
+                self.send_header(
+                    "Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                registry.logger.debug(format % args)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+
+        return server
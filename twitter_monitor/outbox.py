@@ -0,0 +1,351 @@
+# -*- coding: UTF-8 -*-
+
+from . import common
+import contextlib
+import json
+import random
+import threading
+import time
+
+
+class DurableQueue(common.loggable):
+    """
+    Message queue persisted in a SQLite database (WAL mode), so queued
+    messages survive process restarts. A message returned by :meth:`get`
+    is claimed for ``claim_seconds``: it isn't returned again (to this or
+    another consumer) unless it isn't acked or retried in that time. Use
+    :meth:`hold` to keep the claim while a delivery takes longer (e.g.
+    paced by a rate limiter).
+
+    :param path: Database file path (use ":memory:" for tests).
+    :param claim_seconds: Seconds a message is claimed by :meth:`get`.
+    """
+
+    def __init__(self, path, claim_seconds=300):
+        import sqlite3
+
+        self.path = path
+        self.claim_seconds = claim_seconds
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " message TEXT NOT NULL,"
+            " recipient_ids TEXT,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_attempt REAL NOT NULL,"
+            " audience TEXT)")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS messages_next_attempt"
+            " ON messages (next_attempt, id)")
+
+    def put(self, message, recipient_ids=None, now=None, audience=None):
+        """
+        Append a message to the queue. Audience tags are kept as they
+        are, so they are resolved to followers when delivering.
+        """
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO messages"
+                " (message, recipient_ids, next_attempt, audience)"
+                " VALUES (?, ?, ?, ?)",
+                (message, self._dump_ids(recipient_ids),
+                 time.time() if now is None else now,
+                 self._dump_ids(audience)))
+
+    def get(self, now=None):
+        """
+        Claim the next due message, returning a tuple ``(id, message,
+        recipient_ids, attempts, audience)`` or None if no message is due.
+        """
+
+        now = time.time() if now is None else now
+
+        with self._lock:
+            # Read and claim in one transaction, so concurrent consumers
+            # never get the same message.
+            self._conn.execute("BEGIN IMMEDIATE")
+
+            try:
+                row = self._conn.execute(
+                    "SELECT id, message, recipient_ids, attempts, audience"
+                    " FROM messages WHERE next_attempt <= ?"
+                    " ORDER BY next_attempt, id LIMIT 1", (now,)).fetchone()
+
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE messages SET next_attempt = ? WHERE id = ?",
+                        (now + self.claim_seconds, row[0]))
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+            self._conn.execute("COMMIT")
+
+        if row is None:
+            return None
+
+        id, message, recipient_ids, attempts, audience = row
+        return (id, message, self._load_ids(recipient_ids), attempts,
+                self._load_ids(audience))
+
+    def renew(self, id, now=None):
+        """
+        Extend the claim of a message for ``claim_seconds`` from now.
+        """
+
+        now = time.time() if now is None else now
+
+        with self._lock:
+            self._conn.execute(
+                "UPDATE messages SET next_attempt = ? WHERE id = ?",
+                (now + self.claim_seconds, id))
+
+    @contextlib.contextmanager
+    def hold(self, id):
+        """
+        Context manager renewing the claim of a message in background
+        while the block runs, so a slow delivery isn't claimed again by
+        another consumer. Ack or retry the message after the block.
+        """
+
+        if self.claim_seconds <= 0:
+            yield
+            return
+
+        done = threading.Event()
+
+        def renew():
+            while not done.wait(self.claim_seconds / 2.0):
+                try:
+                    self.renew(id)
+                except Exception as e:
+                    self.logger.error("Error renewing claim: " + str(e))
+
+        thread = threading.Thread(target=renew, daemon=True)
+        thread.start()
+
+        try:
+            yield
+        finally:
+            done.set()
+            thread.join()
+
+    def next_attempt(self):
+        """
+        Returns the time of the next scheduled attempt or None if the
+        queue is empty.
+        """
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(next_attempt) FROM messages").fetchone()
+
+        return row[0]
+
+    def ack(self, id):
+        """
+        Remove a delivered message.
+        """
+
+        with self._lock:
+            self._conn.execute("DELETE FROM messages WHERE id = ?", (id,))
+
+    def retry(self, id, next_attempt, recipient_ids=None):
+        """
+        Schedule a new attempt to deliver a message.
+        """
+
+        with self._lock:
+            self._conn.execute(
+                "UPDATE messages SET attempts = attempts + 1,"
+                " next_attempt = ?, recipient_ids = ? WHERE id = ?",
+                (next_attempt, self._dump_ids(recipient_ids), id))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    def _dump_ids(self, recipient_ids):
+        if recipient_ids is None:
+            return None
+
+        return json.dumps(list(recipient_ids), separators=(",", ":"))
+
+    def _load_ids(self, value):
+        return None if value is None else json.loads(value)
+
+
+class Outbox(common.loggable):
+    """
+    Notifier front-end that enqueues messages in a
+    :class:`DurableQueue` and delivers them with a
+    :class:`twitter_monitor.core.Notifier`. Failed deliveries are retried
+    with exponential backoff and jitter, only to the followers that
+    didn't receive the message.
+
+    :param notifier: An instance of :class:`twitter_monitor.core.Notifier`
+    :param queue: An instance of :class:`DurableQueue`
+    :param max_attempts: Attempts before a message is discarded.
+    :param base_delay: Seconds to wait before the first retry.
+    :param max_delay: Max of seconds between retries.
+    """
+
+    def __init__(self, notifier, queue, max_attempts=10, base_delay=5,
+                 max_delay=3600):
+        self.notifier = notifier
+        self.queue = queue
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._wakeup = threading.Event()
+
+    def send(self, message, recipient_ids=None, urgent=False,
+             audience=None):
+        """
+        Enqueue a message to be delivered by the worker (urgent
+        messages are queued too, the worker is woken up anyway). An
+        audience is resolved to followers when delivering.
+        """
+
+        self.queue.put(message, recipient_ids, audience=audience)
+        self._wakeup.set()
+
+        return []
+
+    def recipients(self, audience, recipient_ids=None):
+        """
+        Resolve recipients with the wrapped notifier (see
+        :meth:`twitter_monitor.core.Notifier.recipients`).
+        """
+
+        return self.notifier.recipients(audience, recipient_ids)
+
+    def follower_ids(self):
+        """
+        Returns ids of all followers (see
+        :meth:`twitter_monitor.core.Notifier.follower_ids`).
+        """
+
+        return self.notifier.follower_ids()
+
+    def flush(self, wait=True):
+        """
+        Deliver all due messages now.
+
+        :param wait: If False and the worker is running, it's just woken
+            up to deliver them.
+        """
+
+        if not wait and self._thread is not None:
+            self._wakeup.set()
+            return
+
+        self.deliver_pending()
+
+    def deliver_pending(self, now=None):
+        """
+        Try to deliver all due messages. Returns the number of
+        delivery attempts.
+        """
+
+        now = time.time() if now is None else now
+        count = 0
+
+        while True:
+            item = self.queue.get(now)
+            if item is None:
+                break
+
+            self._deliver(now, *item)
+            count += 1
+
+        return count
+
+    def start(self):
+        """
+        Start the background delivery worker.
+        """
+
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._work, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop the background delivery worker. Pending messages are kept
+        in the queue.
+        """
+
+        self._stop_event.set()
+        self._wakeup.set()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _work(self):
+        while not self._stop_event.is_set():
+            try:
+                self.deliver_pending()
+            except Exception as e:
+                self.logger.error("Error delivering messages: " + str(e))
+
+            next_attempt = self.queue.next_attempt()
+            timeout = None if next_attempt is None \
+                else max(0, next_attempt - time.time())
+
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+    def _deliver(self, now, id, message, recipient_ids, attempts,
+                 audience=None):
+        options = {} if audience is None else {"audience": tuple(audience)}
+
+        try:
+            with self.queue.hold(id):
+                failures = self.notifier.send(
+                    message, recipient_ids, **options)
+        except Exception as e:
+            self.logger.error("Error sending message: " + str(e))
+            failures = None
+        else:
+            if not failures:
+                self.queue.ack(id)
+                return
+
+            recipient_ids = [follower.id for follower, _ in failures]
+
+        if attempts + 1 >= self.max_attempts:
+            self.logger.error(
+                "Discarding message after {} attempts: \"{}\"".format(
+                    attempts + 1, message))
+            self.queue.ack(id)
+            return
+
+        self.queue.retry(id, now + self.backoff(attempts), recipient_ids)
+
+    def backoff(self, attempts):
+        """
+        Seconds to wait before a new attempt (exponential with jitter).
+        """
+
+        delay = min(self.max_delay, self.base_delay * 2 ** attempts)
+        return delay * random.uniform(0.5, 1.5)
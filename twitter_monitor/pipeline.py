@@ -0,0 +1,299 @@
+# -*- coding: UTF-8 -*-
+
+from . import common
+import queue
+import threading
+import time
+
+#: Backpressure policies of :class:`DeliveryPipeline`
+POLICIES = ("block", "drop_oldest", "spill")
+
+_STOP = object()  #: Tells a worker to stop
+
+
+class DeliveryPipeline(common.loggable):
+    """
+    Notifier front-end decoupling routines from delivery: messages are
+    put in a bounded in-memory queue and sent by a pool of worker
+    threads, so routines don't wait for twitter API. When the queue is
+    full, the backpressure policy decides what happens:
+
+    * ``"block"``: the routine waits for room in the queue.
+    * ``"drop_oldest"``: the oldest queued message is discarded.
+    * ``"spill"``: the message is written to a
+      :class:`twitter_monitor.outbox.DurableQueue`, delivered when the
+      in-memory queue is empty.
+
+    Workers are started with :meth:`start`. :meth:`flush` waits until
+    queued messages are delivered (unless ``wait`` is False, so a
+    long-running executor doesn't wait for deliveries on each cycle) and
+    :meth:`stop` drains the queue before stopping workers.
+
+    :param notifier: An instance of :class:`twitter_monitor.core.Notifier`
+    :param workers: Number of delivery threads.
+    :param max_size: Max of messages in the in-memory queue.
+    :param policy: Backpressure policy (see above).
+    :param spill: A :class:`twitter_monitor.outbox.DurableQueue` (required
+        by ``"spill"`` policy; with other policies, messages left when
+        stopping without draining are spilled to it).
+    :param poll_interval: Seconds idle workers wait before looking for
+        spilled messages.
+    :param max_attempts: Attempts to deliver a spilled message before
+        it's discarded.
+    """
+
+    def __init__(self, notifier, workers=2, max_size=1000, policy="block",
+                 spill=None, poll_interval=0.5, max_attempts=10):
+        if policy not in POLICIES:
+            raise ValueError("Invalid backpressure policy: " + str(policy))
+
+        if policy == "spill" and spill is None:
+            raise ValueError("Policy \"spill\" requires a spill queue")
+
+        self.notifier = notifier
+        self.workers = workers
+        self.policy = policy
+        self.spill = spill
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+
+        self.dropped = 0  #: Number of messages discarded
+
+        self._queue = queue.Queue(max_size)
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._threads = []
+
+    def send(self, message, recipient_ids=None, **options):
+        """
+        Queue a message to be delivered by workers. If workers aren't
+        running, the message is sent right away.
+        """
+
+        item = (message, recipient_ids, options)
+
+        if not self._threads:
+            return self._deliver(item)
+
+        if self.policy == "block":
+            self._queue.put(item)
+            return []
+
+        with self._lock:
+            try:
+                self._queue.put_nowait(item)
+                return []
+            except queue.Full:
+                pass
+
+            if self.policy == "spill":
+                self._spill(item)
+                return []
+
+            self._drop_oldest()
+            self._queue.put_nowait(item)
+
+        return []
+
+    def recipients(self, audience, recipient_ids=None):
+        """
+        Resolve recipients with the wrapped notifier (see
+        :meth:`twitter_monitor.core.Notifier.recipients`).
+        """
+
+        return self.notifier.recipients(audience, recipient_ids)
+
+    def follower_ids(self):
+        """
+        Returns ids of all followers (see
+        :meth:`twitter_monitor.core.Notifier.follower_ids`).
+        """
+
+        return self.notifier.follower_ids()
+
+    def flush(self, wait=True):
+        """
+        Wait until queued messages are delivered.
+
+        :param wait: If False and workers are running, return right away
+            (workers deliver queued and spilled messages meanwhile).
+        """
+
+        if self._threads and not wait:
+            return
+
+        if self._threads:
+            self._queue.join()
+        else:
+            self._drain()
+
+        self._deliver_spilled()
+
+        if callable(getattr(self.notifier, "flush", None)):
+            self.notifier.flush()
+
+    def start(self):
+        """
+        Start delivery workers.
+        """
+
+        if self._threads:
+            return
+
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._work, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, drain=True, timeout=None):
+        """
+        Stop delivery workers.
+
+        :param drain: If True (default), queued messages are delivered
+            before workers stop. Otherwise they are spilled (if there is
+            a spill queue) or discarded.
+        :param timeout: Seconds to wait for each worker.
+        """
+
+        if not drain:
+            self._discard_queued()
+
+        threads, self._threads = self._threads, []
+
+        for _ in threads:
+            self._queue.put(_STOP)
+
+        for thread in threads:
+            thread.join(timeout)
+
+        if drain:
+            self._drain()
+            self._deliver_spilled()
+
+        if callable(getattr(self.notifier, "stop", None)):
+            self.notifier.stop()
+
+    def __len__(self):
+        return self._queue.qsize()
+
+    def _work(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.poll_interval)
+            except queue.Empty:
+                self._deliver_spilled()
+                continue
+
+            try:
+                if item is _STOP:
+                    return
+
+                self._deliver(item)
+            finally:
+                self._queue.task_done()
+
+    def _deliver(self, item):
+        message, recipient_ids, options = item
+
+        try:
+            return self.notifier.send(message, recipient_ids, **options)
+        except Exception as e:
+            self.logger.error("Error sending message: " + str(e))
+            return []
+
+    def _drain(self):
+        """
+        Deliver queued messages in the current thread.
+        """
+
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+            try:
+                if item is not _STOP:
+                    self._deliver(item)
+            finally:
+                self._queue.task_done()
+
+    def _drop_oldest(self):
+        try:
+            self._queue.get_nowait()
+            self._queue.task_done()
+        except queue.Empty:
+            return
+
+        self.dropped += 1
+        self.logger.warning("Delivery queue is full, oldest message dropped")
+
+    def _discard_queued(self):
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+            if self.spill is not None:
+                self._spill(item)
+            else:
+                self.dropped += 1
+                self.logger.warning(
+                    "Message not delivered: \"{}\"".format(item[0]))
+
+            self._queue.task_done()
+
+    def _spill(self, item):
+        """
+        Write a message to the spill queue (with its audience, resolved
+        to followers when delivering).
+        """
+
+        message, recipient_ids, options = item
+        self.spill.put(message, recipient_ids,
+                       audience=options.get("audience"))
+
+    def _deliver_spilled(self):
+        if self.spill is None:
+            return
+
+        with self._spill_lock:
+            while True:
+                item = self.spill.get()
+                if item is None:
+                    return
+
+                id, message, recipient_ids, attempts, audience = item
+
+                options = {}
+                if audience is not None:
+                    options["audience"] = tuple(audience)
+
+                try:
+                    with self.spill.hold(id):
+                        failures = self.notifier.send(
+                            message, recipient_ids, **options)
+                except Exception as e:
+                    self.logger.error(
+                        "Error sending spilled message: " + str(e))
+                    self._retry_spilled(id, message, recipient_ids, attempts)
+                    return
+
+                if failures:
+                    self._retry_spilled(
+                        id, message, [follower.id for follower, _ in failures],
+                        attempts)
+                else:
+                    self.spill.ack(id)
+
+    def _retry_spilled(self, id, message, recipient_ids, attempts):
+        if attempts + 1 >= self.max_attempts:
+            self.logger.error(
+                "Discarding message after {} attempts: \"{}\"".format(
+                    attempts + 1, message))
+            self.spill.ack(id)
+            return
+
+        self.spill.retry(
+            id, time.time() + self.spill.claim_seconds, recipient_ids)
@@ -0,0 +1,117 @@
+# -*- coding: UTF-8 -*-
+
+from . import common
+import os
+import threading
+
+
+class Profiler(common.loggable):
+    """
+    Profiles routines runs with *cProfile* and reports slow routines.
+    Use it with ``profiler`` parameter of
+    :class:`twitter_monitor.core.Executor`.
+
+    Executors record the duration of every routine (including
+    :class:`twitter_monitor.aio.AsyncRoutine` subclasses and routines
+    running in worker processes), so all of them are reported when slow.
+    *cProfile* output is only written for routines run by executor
+    threads: coroutines and worker processes aren't profiled. Where
+    *cProfile* can't run in several threads at once (Python 3.12+),
+    routines starting while another one is profiled are only timed.
+
+    :param output_dir: Directory where a ``.pstats`` file is written for
+        each profiled routine. If None, routines are only timed.
+    :param routines: Routines (classes or names) to profile. If None
+        (default), all routines are profiled.
+    :param slow_threshold: Routines taking more than this (in seconds)
+        are listed by :meth:`report`. If None, nothing is reported.
+    """
+
+    def __init__(self, output_dir=None, routines=None, slow_threshold=None):
+        self.output_dir = output_dir
+        self.routines = routines
+        self.slow_threshold = slow_threshold
+
+        self._slow = []
+        self._lock = threading.Lock()
+
+    def run(self, rt):
+        """
+        Run a routine (profiling it if selected), returning its
+        success flag.
+        """
+
+        profile = None
+
+        if self.output_dir is not None and self._selected(rt):
+            import cProfile
+            profile = cProfile.Profile()
+
+            try:
+                profile.enable()
+            except ValueError as e:
+                # Another profiler is active (e.g. in another thread)
+                self.logger.debug("Timing \"{}\" only: {}".format(
+                    str(rt), e))
+                profile = None
+
+        try:
+            return rt.run()
+        finally:
+            if profile is not None:
+                profile.disable()
+                self._dump(rt, profile)
+
+    def record(self, rt, seconds):
+        """
+        Record the duration of a routine run, keeping it for
+        :meth:`report` if it's slow.
+        """
+
+        if self.slow_threshold is None or seconds <= self.slow_threshold:
+            return
+
+        with self._lock:
+            self._slow.append((seconds, str(rt)))
+
+    def report(self):
+        """
+        Log slow routines (slowest first) since the last report.
+        Returns a list of ``(seconds, routine)`` tuples.
+        """
+
+        with self._lock:
+            slow, self._slow = self._slow, []
+
+        if not slow:
+            return slow
+
+        slow.sort(reverse=True)
+
+        lines = ["{:.3f}s {}".format(elapsed, name) for elapsed, name in slow]
+        self.logger.warning("Slow routines (more than {}s):\n{}".format(
+            self.slow_threshold, "\n".join(lines)))
+
+        return slow
+
+    def path(self, rt):
+        """
+        Returns the ``.pstats`` file path of a routine.
+        """
+
+        return os.path.join(self.output_dir, "{}-{}.pstats".format(
+            rt.__class__.__name__, rt.uid[:8]))
+
+    def _selected(self, rt):
+        if self.routines is None:
+            return True
+
+        return any(r is rt.__class__ or r == rt.name for r in self.routines)
+
+    def _dump(self, rt, profile):
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            profile.dump_stats(self.path(rt))
+        except Exception as e:
+            self.logger.error("Error saving profile of \"{}\": {}".format(
+                str(rt), e))
@@ -0,0 +1,186 @@
+# -*- coding: UTF-8 -*-
+
+from . import common
+import json
+import threading
+import time
+
+#: Direct messages an account can send in 24 hours
+DM_DAILY_LIMIT = 1000
+
+
+class TokenBucket(common.loggable):
+    """
+    Token bucket used to pace API calls. It holds up to ``capacity``
+    tokens, refilled at ``rate`` tokens per second, and each call
+    consumes one token.
+
+    :param rate: Tokens added per second.
+    :param capacity: Max of tokens (calls allowed in a burst).
+    :param clock: Function returning current time in seconds.
+    :param sleep: Function used to wait for tokens.
+    :param key_value_store: A dictionary like storage where the bucket
+        state is persisted, so pacing holds across executions (e.g. one
+        process per minute). If None, the state is kept in memory.
+    """
+
+    key = "twitter-monitor:rate-limit"  #: Key used in key-value store
+
+    def __init__(self, rate, capacity=1, clock=time.time, sleep=time.sleep,
+                 key_value_store=None):
+        self.rate = rate
+        self.capacity = capacity
+        self.key_value_store = key_value_store
+        self._clock = clock
+        self._sleep = sleep
+
+        self._tokens = capacity
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+        self._load()
+
+    def acquire(self):
+        """
+        Consume a token, waiting until one is available.
+        """
+
+        with self._lock:
+            wait = self._reserve()
+            self._save()
+
+        if wait > 0:
+            self.logger.debug("Waiting {:.2f}s for a token".format(wait))
+            self._sleep(wait)
+
+    def pause_until(self, timestamp):
+        """
+        Don't release tokens until ``timestamp`` (e.g. the reset time
+        informed by a rate limit response). Tokens borrowed before are
+        forgiven: the next call runs at ``timestamp`` and the bucket is
+        empty after it.
+        """
+
+        with self._lock:
+            if timestamp > self._updated_at:
+                self._updated_at = timestamp
+                self._tokens = 1
+                self._save()
+
+    def _reserve(self):
+        """
+        Take a token, possibly borrowing from the future, and return the
+        seconds to wait until it is really available.
+        """
+
+        now = self._clock()
+
+        if now > self._updated_at:
+            self._tokens = min(
+                self.capacity,
+                self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+
+        self._tokens -= 1
+
+        return self._updated_at - now + max(0, -self._tokens) / self.rate
+
+    def _load(self):
+        if self.key_value_store is None:
+            return
+
+        try:
+            value = self.key_value_store.get(self.key)
+            if value is None:
+                return
+
+            if isinstance(value, bytes):
+                value = value.decode("utf-8")
+
+            data = json.loads(value)
+            self._tokens = min(self.capacity, float(data["tokens"]))
+            self._updated_at = float(data["updated_at"])
+        except Exception as e:
+            self.logger.debug("Exception - Loading rate limit: " + str(e))
+
+    def _save(self):
+        if self.key_value_store is None:
+            return
+
+        data = {"tokens": self._tokens, "updated_at": self._updated_at}
+
+        try:
+            self.key_value_store[self.key] = json.dumps(
+                data, separators=(",", ":"))
+        except Exception as e:
+            self.logger.error("Error saving rate limit: " + str(e))
+
+
+class RateLimiter(common.loggable):
+    """
+    Calls API methods paced by a :class:`TokenBucket`. When the API
+    answers with a rate limit error, the bucket is paused until the reset
+    time informed in response headers and the call is retried.
+
+    :param bucket: A :class:`TokenBucket`. If None, a bucket matching
+        twitter direct messages daily limit is created.
+    :param max_retries: Max of retries after rate limit errors.
+    :param default_wait: Seconds to wait when the response doesn't inform
+        a reset time.
+    :param key_value_store: A dictionary like storage where the default
+        bucket state is persisted.
+    """
+
+    def __init__(self, bucket=None, max_retries=3, default_wait=60,
+                 clock=time.time, key_value_store=None):
+        if bucket is None:
+            bucket = TokenBucket(
+                DM_DAILY_LIMIT / 86400.0, DM_DAILY_LIMIT, clock=clock,
+                key_value_store=key_value_store)
+
+        self.bucket = bucket
+        self.max_retries = max_retries
+        self.default_wait = default_wait
+        self._clock = clock
+
+    def call(self, func, *args, **kwargs):
+        """
+        Call ``func`` with the given arguments after acquiring a token.
+        """
+
+        attempt = 0
+
+        while True:
+            self.bucket.acquire()
+
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                reset = self.rate_limit_reset(e)
+                if reset is None or attempt >= self.max_retries:
+                    raise
+
+                self.logger.warning(
+                    "Rate limited, waiting until {}".format(reset))
+                self.bucket.pause_until(reset)
+                attempt += 1
+
+    def rate_limit_reset(self, error):
+        """
+        Returns the time (in seconds since epoch) when the rate limit
+        resets or None if ``error`` isn't a rate limit error.
+        """
+
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code",
+                         getattr(response, "status", None))
+
+        if status != 429 and getattr(error, "api_code", None) != 88:
+            return None
+
+        headers = getattr(response, "headers", None) or {}
+
+        try:
+            return float(headers["x-rate-limit-reset"])
+        except (KeyError, TypeError, ValueError):
+            return self._clock() + self.default_wait
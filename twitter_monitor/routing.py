@@ -0,0 +1,95 @@
+# -*- coding: UTF-8 -*-
+
+from . import common
+import threading
+
+
+class AudienceIndex(common.loggable):
+    """
+    Maps followers to audience tags, keeping a tag => follower ids index
+    so the recipients of a routine audience (see
+    :attr:`twitter_monitor.core.Routine.audience`) are found without
+    going through all followers. The index is updated incrementally
+    with :meth:`followers_changed` (a
+    :class:`twitter_monitor.followers.FollowerCache` listener).
+
+    :param tags: A dictionary with follower screen names (case
+        insensitive) and their tags, e.g. ``{"alice": ["db", "infra"]}``.
+    """
+
+    def __init__(self, tags=None):
+        self._tags = {}
+        self._followers = {}  # Follower id => screen name
+        self._index = {}  # Tag => follower ids
+        self._lock = threading.Lock()
+
+        for screen_name, follower_tags in (tags or {}).items():
+            self.set_tags(screen_name, follower_tags)
+
+    def set_tags(self, screen_name, tags):
+        """
+        Set tags of a follower (an empty list removes them).
+        """
+
+        screen_name = screen_name.lower()
+        tags = frozenset(tags)
+
+        with self._lock:
+            old_tags = self._tags.get(screen_name, frozenset())
+            if tags:
+                self._tags[screen_name] = tags
+            else:
+                self._tags.pop(screen_name, None)
+
+            ids = [i for i, name in self._followers.items()
+                   if name == screen_name]
+
+            for tag in old_tags - tags:
+                self._discard(tag, ids)
+
+            for tag in tags - old_tags:
+                self._index.setdefault(tag, set()).update(ids)
+
+    def followers_changed(self, added, removed):
+        """
+        Update the index with followers added to and removed from the
+        follower list.
+
+        :param added: List of :class:`twitter_monitor.followers.Follower`
+        :param removed: List of :class:`twitter_monitor.followers.Follower`
+        """
+
+        with self._lock:
+            for follower in removed:
+                name = self._followers.pop(follower.id, None)
+                for tag in self._tags.get(name, ()):
+                    self._discard(tag, [follower.id])
+
+            for follower in added:
+                name = follower.screen_name.lower()
+                self._followers[follower.id] = name
+
+                for tag in self._tags.get(name, ()):
+                    self._index.setdefault(tag, set()).add(follower.id)
+
+    def recipients(self, audience):
+        """
+        Returns a set with ids of followers tagged with any of the
+        audience tags.
+        """
+
+        with self._lock:
+            ids = set()
+            for tag in audience:
+                ids.update(self._index.get(tag, ()))
+
+            return ids
+
+    def _discard(self, tag, ids):
+        recipients = self._index.get(tag)
+        if recipients is None:
+            return
+
+        recipients.difference_update(ids)
+        if not recipients:
+            del self._index[tag]
@@ -0,0 +1,142 @@
+# -*- coding: UTF-8 -*-
+
+import datetime
+import functools
+
+
+class IntervalSchedule(object):
+    """
+    Runs a routine every ``seconds``. With a ``phase``, executions are
+    aligned to ``phase + k * seconds`` (seconds since epoch), so routines
+    with the same interval and different phases don't run together.
+
+    :param seconds: Interval between executions (it must be positive
+        when there is a phase).
+    :param phase: Offset (in seconds) of executions inside the interval.
+    """
+
+    def __init__(self, seconds, phase=None):
+        if seconds < 0 or (phase is not None and seconds <= 0):
+            raise ValueError("Invalid interval: {} seconds".format(seconds))
+
+        self.seconds = seconds
+        self.phase = phase
+
+    def next_due(self, last, now):
+        """
+        Returns the time (seconds since epoch) of the next execution after
+        ``last`` or None if it must run now. With a phase, the first
+        execution waits for the next slot, so routines starting together
+        are spread as well.
+        """
+
+        if self.phase is None:
+            return None if last is None else last + self.seconds
+
+        if last is None:
+            slots = -((self.phase - now) // self.seconds)
+            return self.phase + slots * self.seconds
+
+        # Next slot after half an interval, so a late execution doesn't
+        # make the routine run twice in a row.
+        slots = (last + self.seconds / 2.0 - self.phase) // self.seconds
+        return self.phase + (slots + 1) * self.seconds
+
+
+class CronSchedule(object):
+    """
+    Runs a routine at times matching a cron expression with five fields
+    (minute, hour, day of month, month and day of week). Fields accept
+    ``*``, numbers, ranges (``1-5``), steps (``*/15``, ``0-30/10``)
+    and lists (``1,15``). Day of week goes from 0 (sunday) to 6 (7 is
+    also sunday).
+
+    :param expression: A cron expression like ``*/5 * * * *``.
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        (self.minutes, self.hours, self.days, self.months, self.weekdays,
+         self.days_restricted, self.weekdays_restricted) = \
+            _parse_cron(expression)
+
+    def next_due(self, last, now):
+        """
+        Returns the time (seconds since epoch) of the next match after
+        ``last``. If the routine never ran, the current minute counts.
+        """
+
+        start = now - 60 if last is None else last
+        dt = datetime.datetime.fromtimestamp(start).replace(
+            second=0, microsecond=0) + datetime.timedelta(minutes=1)
+
+        # Five years are enough for any valid expression (Feb 29)
+        limit = dt + datetime.timedelta(days=5 * 366)
+
+        while dt < limit:
+            if dt.month not in self.months:
+                month = dt.month % 12 + 1
+                year = dt.year + (dt.month == 12)
+                dt = dt.replace(year=year, month=month, day=1, hour=0,
+                                minute=0)
+            elif not self._day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + \
+                    datetime.timedelta(days=1)
+            elif dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + datetime.timedelta(hours=1)
+            elif dt.minute not in self.minutes:
+                dt += datetime.timedelta(minutes=1)
+            else:
+                return dt.timestamp()
+
+        raise ValueError(
+            "Cron expression never matches: \"{}\"".format(self.expression))
+
+    def _day_matches(self, dt):
+        day = dt.day in self.days
+        weekday = (dt.weekday() + 1) % 7 in self.weekdays
+
+        if self.days_restricted and self.weekdays_restricted:
+            return day or weekday
+
+        return day and weekday
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_cron(expression):
+    fields = expression.split()
+    if len(fields) != 5:
+        raise ValueError(
+            "Cron expression must have 5 fields: \"{}\"".format(expression))
+
+    minutes = _parse_field(fields[0], 0, 59)
+    hours = _parse_field(fields[1], 0, 23)
+    days = _parse_field(fields[2], 1, 31)
+    months = _parse_field(fields[3], 1, 12)
+    weekdays = frozenset(d % 7 for d in _parse_field(fields[4], 0, 7))
+
+    return (minutes, hours, days, months, weekdays,
+            fields[2] != "*", fields[4] != "*")
+
+
+def _parse_field(field, minimum, maximum):
+    values = set()
+
+    for part in field.split(","):
+        value_range, _, step = part.partition("/")
+        step = int(step) if step else 1
+
+        if value_range == "*":
+            start, end = minimum, maximum
+        elif "-" in value_range:
+            start, end = [int(v) for v in value_range.split("-", 1)]
+        else:
+            start = int(value_range)
+            end = maximum if step > 1 else start
+
+        if start < minimum or end > maximum or start > end or step < 1:
+            raise ValueError("Invalid cron field: \"{}\"".format(field))
+
+        values.update(range(start, end + 1, step))
+
+    return frozenset(values)
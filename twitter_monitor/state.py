@@ -0,0 +1,176 @@
+# -*- coding: UTF-8 -*-
+
+from .store import KeyValueStore
+import datetime
+import threading
+import time
+
+#: Format of timestamps saved in key-value store
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def format_timestamp(timestamp):
+    """
+    Convert a timestamp (seconds since epoch) to the string saved in
+    key-value store.
+    """
+
+    return datetime.datetime.fromtimestamp(timestamp).strftime(
+        TIMESTAMP_FORMAT)
+
+
+def parse_timestamp(value):
+    """
+    Convert a string saved in key-value store to a timestamp (seconds
+    since epoch). Returns None for empty or invalid values.
+    """
+
+    if isinstance(value, bytes):
+        value = value.decode("utf-8")
+
+    if not value:
+        return None
+
+    for fmt in (TIMESTAMP_FORMAT, "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.datetime.strptime(value, fmt).timestamp()
+        except ValueError:
+            pass
+
+    return None
+
+
+class StateCache(KeyValueStore):
+    """
+    Write-behind cache in front of a key-value store. Values are loaded
+    in bulk with :meth:`prefetch` and changes are kept in memory until
+    :meth:`flush` writes them back in a single batch. Timestamps are
+    kept parsed (seconds since epoch), so they are read without parsing
+    strings again.
+
+    :param store: A dictionary like storage.
+    :param flush_interval: Seconds between flushes done by
+        :meth:`flush_if_due`.
+    """
+
+    def __init__(self, store, flush_interval=60):
+        self.store = store
+        self.flush_interval = flush_interval
+
+        self._values = {}
+        self._timestamps = {}
+        self._dirty = set()
+        self._flushed_at = time.time()
+        self._lock = threading.RLock()
+
+    def prefetch(self, keys):
+        """
+        Load the given keys (not loaded yet) with a single bulk read.
+        """
+
+        with self._lock:
+            keys = [key for key in keys if key not in self._values]
+            if not keys:
+                return
+
+            if isinstance(self.store, KeyValueStore):
+                values = self.store.get_many(keys)
+            else:
+                values = {key: self.store[key]
+                          for key in keys if key in self.store}
+
+            for key in keys:
+                self._values[key] = values.get(key)
+
+    def __getitem__(self, key):
+        with self._lock:
+            if key not in self._values:
+                self.prefetch([key])
+
+            value = self._values[key]
+
+        if value is None:
+            raise KeyError(key)
+
+        return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._values[key] = value
+            self._timestamps.pop(key, None)
+            self._dirty.add(key)
+
+    def __delitem__(self, key):
+        with self._lock:
+            self[key]
+            self._values[key] = None
+            self._timestamps.pop(key, None)
+            self._dirty.discard(key)
+
+            del self.store[key]
+
+    def __iter__(self):
+        with self._lock:
+            keys = set(self.store) | set(self._values)
+            return iter([key for key in keys if key in self])
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+    def get_timestamp(self, key):
+        """
+        Returns the timestamp (seconds since epoch) saved in ``key`` or
+        None.
+        """
+
+        with self._lock:
+            if key not in self._timestamps:
+                self._timestamps[key] = parse_timestamp(self.get(key))
+
+            return self._timestamps[key]
+
+    def set_timestamp(self, key, timestamp):
+        """
+        Save a timestamp (seconds since epoch) in ``key``.
+        """
+
+        with self._lock:
+            self[key] = format_timestamp(timestamp)
+            self._timestamps[key] = timestamp
+
+    def flush(self):
+        """
+        Write changed values back to the store in a single batch. If
+        writing fails, values are kept to be written by the next flush.
+        """
+
+        with self._lock:
+            self._flushed_at = time.time()
+
+            if not self._dirty:
+                return
+
+            items = {key: self._values[key] for key in self._dirty}
+
+            if isinstance(self.store, KeyValueStore):
+                self.store.set_many(items)
+            else:
+                for key, value in items.items():
+                    self.store[key] = value
+
+                if callable(getattr(self.store, "sync", None)):
+                    self.store.sync()
+
+            self._dirty.clear()
+
+    def flush_if_due(self):
+        """
+        Flush if ``flush_interval`` seconds have elapsed since the
+        last flush.
+        """
+
+        if time.time() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def close(self):
+        self.flush()
@@ -0,0 +1,303 @@
+# -*- coding: UTF-8 -*-
+
+from abc import abstractmethod
+from . import common
+import collections.abc
+import threading
+
+
+class KeyValueStore(common.loggable, collections.abc.MutableMapping):
+    """
+    Base class of key-value stores used to keep routines state. Keys and
+    values are strings.
+    """
+
+    @abstractmethod
+    def __getitem__(self, key):
+        return NotImplemented
+
+    @abstractmethod
+    def __setitem__(self, key, value):
+        return NotImplemented
+
+    @abstractmethod
+    def __delitem__(self, key):
+        return NotImplemented
+
+    @abstractmethod
+    def __iter__(self):
+        return NotImplemented
+
+    @abstractmethod
+    def __len__(self):
+        return NotImplemented
+
+    def get_many(self, keys):
+        """
+        Returns a dictionary with the values of the given keys
+        (missing keys are left out).
+        """
+
+        values = {}
+
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                values[key] = value
+
+        return values
+
+    def set_many(self, items):
+        """
+        Set many values at once.
+
+        :param items: A dictionary with keys and values to set.
+        """
+
+        for key, value in items.items():
+            self[key] = value
+
+    def close(self):
+        pass
+
+
+class MemoryStore(KeyValueStore):
+    """
+    Store keeping values in memory (lost when the process finishes).
+    """
+
+    def __init__(self, path=None):
+        self._data = {}
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __setitem__(self, key, value):
+        self._data[key] = value
+
+    def __delitem__(self, key):
+        del self._data[key]
+
+    def __iter__(self):
+        return iter(list(self._data))
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DbmStore(KeyValueStore):
+    """
+    Store backed by a *dbm* file.
+
+    :param path: Database file path.
+    """
+
+    def __init__(self, path):
+        import dbm
+
+        self.path = path
+        self._db = dbm.open(path, "c")
+
+    def __getitem__(self, key):
+        value = self._db[key]
+        return value.decode("utf-8") if isinstance(value, bytes) else value
+
+    def __setitem__(self, key, value):
+        self._db[key] = value
+
+    def __delitem__(self, key):
+        del self._db[key]
+
+    def __contains__(self, key):
+        return key in self._db
+
+    def __iter__(self):
+        for key in self._db.keys():
+            yield key.decode("utf-8") if isinstance(key, bytes) else key
+
+    def __len__(self):
+        return len(self._db)
+
+    def set_many(self, items):
+        super().set_many(items)
+
+        if callable(getattr(self._db, "sync", None)):
+            self._db.sync()
+
+    def close(self):
+        self._db.close()
+
+
+class SQLiteStore(KeyValueStore):
+    """
+    Store backed by a SQLite database in WAL mode. Bulk operations run
+    in a single transaction.
+
+    :param path: Database file path.
+    """
+
+    #: Max of keys per query in :meth:`get_many`
+    batch_size = 500
+
+    def __init__(self, path):
+        import sqlite3
+
+        self.path = path
+        self._lock = threading.RLock()
+
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def __getitem__(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+
+        if row is None:
+            raise KeyError(key)
+
+        return row[0]
+
+    def __setitem__(self, key, value):
+        self.set_many({key: value})
+
+    def __delitem__(self, key):
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+
+        if cursor.rowcount == 0:
+            raise KeyError(key)
+
+    def __iter__(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT key FROM kv").fetchall()
+
+        return iter([row[0] for row in rows])
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM kv").fetchone()[0]
+
+    def get_many(self, keys):
+        keys = list(keys)
+        values = {}
+
+        with self._lock:
+            for i in range(0, len(keys), self.batch_size):
+                batch = keys[i:i + self.batch_size]
+                query = "SELECT key, value FROM kv WHERE key IN ({})".format(
+                    ",".join("?" * len(batch)))
+
+                values.update(self._conn.execute(query, batch).fetchall())
+
+        return values
+
+    def set_many(self, items):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)",
+                    items.items())
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+            self._conn.execute("COMMIT")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class SynchronizedStore(KeyValueStore):
+    """
+    Wraps a dictionary like storage guarding every access with a lock,
+    so it can be shared by routines running in many threads.
+
+    :param store: A dictionary like storage (like *anydbm*).
+    """
+
+    def __init__(self, store):
+        self._store = store
+        self._lock = threading.RLock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._store
+
+    def __getitem__(self, key):
+        with self._lock:
+            return self._store[key]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._store[key] = value
+
+    def __delitem__(self, key):
+        with self._lock:
+            del self._store[key]
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._store))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._store)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._store:
+                return self._store[key]
+
+            return default
+
+    def get_many(self, keys):
+        with self._lock:
+            if isinstance(self._store, KeyValueStore):
+                return self._store.get_many(keys)
+
+            return super().get_many(keys)
+
+    def set_many(self, items):
+        with self._lock:
+            if isinstance(self._store, KeyValueStore):
+                self._store.set_many(items)
+            else:
+                super().set_many(items)
+
+    def close(self):
+        with self._lock:
+            if callable(getattr(self._store, "close", None)):
+                self._store.close()
+
+
+#: Available store backends
+BACKENDS = {
+    "memory": MemoryStore,
+    "dbm": DbmStore,
+    "sqlite": SQLiteStore,
+}
+
+
+def open_store(backend, path=None):
+    """
+    Create a store of the given backend.
+
+    :param backend: One of ``memory``, ``dbm`` or ``sqlite``.
+    :param path: Database file path (ignored by ``memory`` backend).
+    """
+
+    try:
+        store_class = BACKENDS[backend]
+    except KeyError:
+        raise ValueError("Unknown store backend: \"{}\"".format(backend))
+
+    return store_class(path)